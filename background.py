@@ -0,0 +1,54 @@
+# background.py -- socle commun des services à tâche de fond (démarrés et fermés par bot.main)
+import asyncio
+import logging
+from typing import Optional
+
+
+class BackgroundService:
+    """Une tâche de fond par service : start() la lance (idempotent), close() l'annule et attend sa fin.
+
+    Les sous-classes implémentent _run() ; PeriodicService en fournit une boucle toute faite.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        raise NotImplementedError
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+class PeriodicService(BackgroundService):
+    """Appelle run_once() en boucle, à next_delay() secondes d'intervalle.
+
+    Une erreur est journalisée (failure_message) sans arrêter la boucle.
+    """
+
+    logger = logging.getLogger("dh2")
+    failure_message = "Tâche de fond échouée"
+
+    async def run_once(self):
+        raise NotImplementedError
+
+    def next_delay(self) -> float:
+        raise NotImplementedError
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.logger.error(f"❌ {self.failure_message} : {e}")
+            await asyncio.sleep(self.next_delay())
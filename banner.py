@@ -0,0 +1,202 @@
+# banner.py -- rendu de la bannière de bienvenue (Pillow) hors de la boucle asyncio
+import asyncio
+import io
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from config import (
+    WELCOME_BACKGROUND_PATH, WELCOME_FONT_PATH,
+    WELCOME_RENDER_EXECUTOR, WELCOME_RENDER_WORKERS, WELCOME_RENDER_QUEUE,
+    WELCOME_BANNER_FORMAT, WELCOME_PNG_COMPRESS_LEVEL, WELCOME_WEBP_QUALITY, WELCOME_WEBP_METHOD,
+    WELCOME_AVATAR_CACHE_SIZE,
+)
+
+logger = logging.getLogger("dh2.banner")
+
+# --- Constantes pour l'Image ---
+TEXT_COLOR_FILL = (250, 250, 250, 255) 
+OUTLINE_COLOR_DARK_RED = (139, 0, 0, 255)  
+GLOW_COLOR_SINGLE = (255, 200, 200, 255) 
+AVATAR_SIZE = 180 
+AVATAR_CDN_SIZE = 256 # Plus petite variante du CDN Discord (puissance de 2) >= AVATAR_SIZE
+OUTLINE_THICKNESS = 5 
+GLOW_RADIUS_SINGLE = 12 
+GLOW_SOFTNESS = 4 # Flou appliqué au halo (px)
+BANNER_FILENAME = f"welcome_banner.{'webp' if WELCOME_BANNER_FORMAT == 'WEBP' else 'png'}"
+
+font_path = Path(WELCOME_FONT_PATH)
+try:
+    if font_path.exists():
+        resolved_font_path = str(font_path.resolve())
+        FONT_NOM = ImageFont.truetype(resolved_font_path, 100) 
+    else:
+        # Fallback pour le développement ou l'hébergement
+        FONT_NOM = ImageFont.load_default(size=60)
+except Exception:
+    FONT_NOM = ImageFont.load_default(size=60)
+# ----------------------------------------------------
+
+
+@lru_cache(maxsize=1)
+def _template() -> Optional[Tuple[Image.Image, Image.Image]]:
+    """Fond décodé et masque circulaire de l'avatar, préparés une fois par processus."""
+    background_path = Path(WELCOME_BACKGROUND_PATH)
+    if not background_path.exists():
+        return None
+    background = Image.open(str(background_path.resolve()))
+    # Sans transparence, RGB suffit : un quart de données en moins à composer et encoder
+    background = background.convert("RGBA" if "A" in background.getbands() else "RGB")
+    mask = Image.new("L", (AVATAR_SIZE, AVATAR_SIZE), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
+    return background, mask
+
+def _dilate(mask: Image.Image, radius: float) -> Image.Image:
+    """Dilatation ~circulaire du masque : flou gaussien (σ = r/2) puis seuil (≈ 2σ)."""
+    return mask.filter(ImageFilter.GaussianBlur(radius / 2)).point(lambda v: 255 if v > 5 else 0)
+
+def _encode(image: Image.Image) -> bytes:
+    buffer_final = io.BytesIO()
+    if WELCOME_BANNER_FORMAT == "WEBP":
+        image.save(buffer_final, format="WEBP", quality=WELCOME_WEBP_QUALITY, method=WELCOME_WEBP_METHOD)
+    else:
+        image.save(buffer_final, format="PNG", compress_level=WELCOME_PNG_COMPRESS_LEVEL)
+    return buffer_final.getvalue()
+
+def decode_avatar(avatar_bytes: bytes) -> Image.Image:
+    """Avatar décodé et redimensionné, prêt à coller sur la bannière."""
+    return Image.open(io.BytesIO(avatar_bytes)).convert("RGBA").resize((AVATAR_SIZE, AVATAR_SIZE))
+
+def render_welcome_banner(avatar: Image.Image, nom_text: str) -> Optional[bytes]:
+    """Compose la bannière ; fonction pure et synchrone, exécutée dans le pool.
+
+    Le nom n'est dessiné qu'une fois, dans un masque ; halo et contour en sont dérivés
+    par dilatation/flou (filtres C de Pillow) au lieu de 28 appels à draw.text().
+    """
+    template = _template()
+    if template is None:
+        return None
+    background, avatar_mask = template
+    background = background.copy()
+    avatar_x = (background.width // 2) - (AVATAR_SIZE // 2) 
+    avatar_y = 50 
+    background.paste(avatar, (avatar_x, avatar_y), avatar_mask)
+
+    # Masque du texte, avec une marge pour le halo
+    bbox_nom = FONT_NOM.getbbox(nom_text)
+    nom_width = bbox_nom[2] - bbox_nom[0]
+    nom_height = bbox_nom[3] - bbox_nom[1]
+    margin = GLOW_RADIUS_SINGLE + 2 * GLOW_SOFTNESS
+    text_mask = Image.new("L", (nom_width + 2 * margin, nom_height + 2 * margin), 0)
+    ImageDraw.Draw(text_mask).text((margin - bbox_nom[0], margin - bbox_nom[1]), nom_text, font=FONT_NOM, fill=255)
+    glow_mask = _dilate(text_mask, GLOW_RADIUS_SINGLE).filter(ImageFilter.GaussianBlur(GLOW_SOFTNESS))
+    outline_mask = _dilate(text_mask, OUTLINE_THICKNESS)
+
+    # Même position que l'ancien draw.text((x, y + text_y_offset))
+    nom_x = (background.width - nom_width) // 2 - margin
+    nom_y = (background.height // 2) + 10 - margin
+    box = (nom_x, nom_y, nom_x + text_mask.width, nom_y + text_mask.height)
+    bands = len(background.getbands())
+    background.paste(GLOW_COLOR_SINGLE[:bands], box, glow_mask)
+    background.paste(OUTLINE_COLOR_DARK_RED[:bands], box, outline_mask)
+    background.paste(TEXT_COLOR_FILL[:bands], box, text_mask)
+    return _encode(background)
+
+
+class AvatarCache:
+    """Avatars décodés (AVATAR_SIZE px), en LRU par hash d'avatar Discord.
+
+    Le téléchargement passe par Asset.read() (session HTTP du bot, déjà ouverte) et demande
+    la variante AVATAR_CDN_SIZE au CDN plutôt que l'image en taille réelle. Un retour sur le
+    serveur, ou un nouveau rendu, ne coûte donc aucun appel réseau.
+    """
+
+    def __init__(self, maxsize: int = WELCOME_AVATAR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._avatars: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_downloaded = 0
+
+    async def get(self, asset: Any) -> Image.Image:
+        """asset : discord.Asset (ex. member.display_avatar)."""
+        key = asset.key # Hash de l'avatar : change quand l'utilisateur change d'avatar
+        avatar = self._avatars.get(key)
+        if avatar is not None:
+            self._avatars.move_to_end(key)
+            self.hits += 1
+            return avatar
+        self.misses += 1
+        data = await asset.with_size(AVATAR_CDN_SIZE).read()
+        self.bytes_downloaded += len(data)
+        avatar = await asyncio.to_thread(decode_avatar, data)
+        if self.maxsize > 0:
+            self._avatars[key] = avatar
+            while len(self._avatars) > self.maxsize:
+                self._avatars.popitem(last=False)
+        return avatar
+
+    def stats(self) -> dict:
+        return {"size": len(self._avatars), "hits": self.hits, "misses": self.misses, "bytes": self.bytes_downloaded}
+
+
+class BannerQueueFull(Exception):
+    """Trop de bannières en attente : l'appelant se rabat sur un message texte."""
+
+
+class BannerRenderer:
+    """Exécute render_welcome_banner dans un pool de threads ou de processus.
+
+    La boucle asyncio ne fait que l'attendre : heartbeats et commandes restent fluides
+    pendant une vague d'arrivées. Au-delà de `workers + queue_size` rendus en cours,
+    render() lève BannerQueueFull au lieu d'empiler du travail.
+    """
+
+    def __init__(
+        self,
+        kind: str = WELCOME_RENDER_EXECUTOR,
+        workers: int = WELCOME_RENDER_WORKERS,
+        queue_size: int = WELCOME_RENDER_QUEUE,
+    ):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = self.workers + max(0, queue_size)
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="banner")
+        return self._executor
+
+    async def render(self, avatar: Image.Image, display_name: str) -> Optional[bytes]:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise BannerQueueFull(f"{self.pending} bannières en attente")
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self._get_executor(), render_welcome_banner, avatar, display_name)
+        finally:
+            self.pending -= 1
+        self.rendered += 1
+        logger.debug(f"Bannière rendue en {(time.perf_counter() - started) * 1000:.0f} ms")
+        return data
+
+    def stats(self) -> dict:
+        return {"pending": self.pending, "rendered": self.rendered, "rejected": self.rejected}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
\ No newline at end of file
@@ -0,0 +1,116 @@
+# battle_ingest.py -- ingestion en tâche de fond des journaux de combats des comptes liés
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from background import PeriodicService
+from cr_api import CRClient, CRApiError, Battle, PRIORITY_BACKGROUND, is_stale
+from config import (
+    BATTLE_INGEST_TICK, BATTLE_INGEST_MIN_INTERVAL, BATTLE_INGEST_MAX_INTERVAL, BATTLE_INGEST_CONCURRENCY,
+)
+from db import get_all_user_tags, insert_battles, get_latest_battle_times, clean_tag
+
+logger = logging.getLogger("dh2.battles")
+
+API_BATTLELOG_SIZE = 25 # L'API ne garde que les 25 derniers combats
+
+
+def battle_row(tag: str, b: Battle) -> Tuple:
+    return (tag, b.battle_time, b.type, b.team_crowns, b.opponent_crowns, b.opponent_name, json.dumps(list(b.team_deck)))
+
+
+class BattleLogIngestor(PeriodicService):
+    """Copie dans SQLite les nouveaux combats de chaque compte lié.
+
+    Chaque joueur a son propre intervalle : divisé par deux quand de nouveaux combats
+    apparaissent, doublé sinon (entre BATTLE_INGEST_MIN_INTERVAL et BATTLE_INGEST_MAX_INTERVAL).
+    Les combats déjà vus (battle_time <= dernier connu) sont écartés en mémoire ; les
+    nouveaux de tous les joueurs d'un passage sont insérés en une seule transaction.
+    """
+
+    logger = logger
+    failure_message = "Ingestion des combats échouée"
+
+    def __init__(
+        self,
+        cr: CRClient,
+        tick: float = BATTLE_INGEST_TICK,
+        min_interval: float = BATTLE_INGEST_MIN_INTERVAL,
+        max_interval: float = BATTLE_INGEST_MAX_INTERVAL,
+        concurrency: int = BATTLE_INGEST_CONCURRENCY,
+    ):
+        super().__init__()
+        self.cr = cr
+        self.tick = tick
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.concurrency = max(1, concurrency)
+        self.latest: Dict[str, str] = {}                         # tag -> dernier battle_time enregistré
+        self.schedule: Dict[str, Tuple[float, float]] = {}       # tag -> (prochain passage, intervalle)
+        self.inserted = 0
+
+    def _next_interval(self, interval: float, new_battles: int) -> float:
+        if new_battles >= API_BATTLELOG_SIZE:
+            return self.min_interval # Journal entièrement renouvelé : des combats ont pu être perdus
+        if new_battles:
+            return max(self.min_interval, interval / 2)
+        return min(self.max_interval, interval * 2)
+
+    async def _fetch_new(self, tag: str, sem: asyncio.Semaphore) -> Optional[List[Tuple]]:
+        async with sem:
+            try:
+                battles = await self.cr.get_battle_log(tag, priority=PRIORITY_BACKGROUND)
+            except CRApiError as e:
+                logger.debug(f"Journal de combats de #{tag} indisponible : {e}")
+                return None
+        if is_stale(battles):
+            return None
+        last = self.latest.get(tag, "")
+        # battleTime (20240101T120000.000Z) se compare comme une chaîne
+        return [battle_row(tag, b) for b in battles if b.battle_time and b.battle_time > last]
+
+    async def run_once(self, now: Optional[float] = None) -> int:
+        """Un passage : journaux des joueurs dont l'heure est venue, puis insertion groupée."""
+        now = now if now is not None else time.time()
+        tags = {clean_tag(t) for t in (await get_all_user_tags()).values()}
+        for tag in list(self.schedule):
+            if tag not in tags:
+                del self.schedule[tag] # Compte délié
+        for tag in tags:
+            self.schedule.setdefault(tag, (now, self.min_interval))
+        due = [tag for tag, (next_at, _) in self.schedule.items() if next_at <= now]
+        if not due:
+            return 0
+
+        started = time.perf_counter()
+        sem = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*(self._fetch_new(tag, sem) for tag in due))
+        rows: List[Tuple] = []
+        for tag, new_rows in zip(due, results):
+            interval = self.schedule[tag][1]
+            if new_rows is None:
+                self.schedule[tag] = (now + interval, interval) # Erreur : même rythme
+                continue
+            interval = self._next_interval(interval, len(new_rows))
+            self.schedule[tag] = (now + interval, interval)
+            rows.extend(new_rows)
+
+        inserted = await insert_battles(rows)
+        for row in rows:
+            if row[1] > self.latest.get(row[0], ""):
+                self.latest[row[0]] = row[1]
+        self.inserted += inserted
+        if rows:
+            logger.info(
+                f"⚔️ Combats : {inserted} nouveaux enregistrés pour {len(due)} joueurs "
+                f"en {time.perf_counter() - started:.1f}s."
+            )
+        return inserted
+
+    def next_delay(self) -> float:
+        return self.tick
+
+    async def start(self):
+        self.latest = {clean_tag(t): bt for t, bt in (await get_latest_battle_times()).items()}
+        await super().start()
@@ -0,0 +1,126 @@
+# battle_stats.py -- statistiques de decks calculées sur le journal de combats d'un joueur
+from array import array
+from collections import Counter
+from itertools import compress
+from operator import sub
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from cr_api import Battle
+
+TOP_CARDS = 5
+
+
+class BattleColumns:
+    """Journal de combats en colonnes compactes (array) : une entrée par combat complet.
+
+    types    : code du type de combat (index dans `type_names`)
+    team     : couronnes du joueur ; opponent : couronnes de l'adversaire
+    decks    : ids de cartes à plat (deck_sizes[i] cartes pour le combat i), noms dans `card_names`
+    Les agrégats se font ensuite par des passes globales (zip/map/sum/compress, boucles C)
+    plutôt qu'objet par objet.
+    """
+    __slots__ = ("type_names", "card_names", "types", "team", "opponent", "decks", "deck_sizes", "latest")
+
+    def __init__(self, battles: Iterable[Battle]):
+        self.type_names: List[str] = []
+        self.card_names: List[str] = []
+        self.types = array("B")
+        self.team = array("b")
+        self.opponent = array("b")
+        self.decks = array("H")
+        self.deck_sizes = array("B")
+        self.latest: Optional[str] = None # battleTime du combat le plus récent
+        type_ids: Dict[str, int] = {}
+        card_ids: Dict[str, int] = {}
+        for b in battles:
+            if self.latest is None:
+                self.latest = b.battle_time # L'API liste du plus récent au plus ancien
+            if b.team_crowns is None:
+                continue # Combat sans équipe/adversaire
+            if b.type not in type_ids:
+                type_ids[b.type] = len(self.type_names)
+                self.type_names.append(b.type)
+            self.types.append(type_ids[b.type])
+            self.team.append(b.team_crowns)
+            self.opponent.append(b.opponent_crowns)
+            for name in b.team_deck:
+                if name not in card_ids:
+                    card_ids[name] = len(self.card_names)
+                    self.card_names.append(name)
+                self.decks.append(card_ids[name])
+            self.deck_sizes.append(len(b.team_deck))
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+
+def compute_stats(log: BattleColumns, elixir_of: Callable[[str], Optional[float]]) -> Dict[str, Any]:
+    """Taux de victoire par type, élixir moyen des decks, cartes les plus jouées, écart de couronnes."""
+    n = len(log)
+    if not n:
+        return {"battles": 0}
+    diffs = array("b", map(sub, log.team, log.opponent))
+    wins = array("B", (d > 0 for d in diffs))
+    losses = array("B", (d < 0 for d in diffs))
+
+    by_type: Dict[str, Tuple[int, int, int]] = {}
+    played = Counter(log.types)
+    won = Counter(compress(log.types, wins))
+    lost = Counter(compress(log.types, losses))
+    for type_id, count in played.items():
+        by_type[log.type_names[type_id]] = (count, won[type_id], lost[type_id])
+
+    # Élixir : coût de chaque carte distincte résolu une fois, puis moyenne par deck
+    costs = [elixir_of(name) for name in log.card_names]
+    deck_averages: List[float] = []
+    start = 0
+    for size in log.deck_sizes:
+        known = [costs[i] for i in log.decks[start:start + size] if costs[i] is not None]
+        if known:
+            deck_averages.append(sum(known) / len(known))
+        start += size
+
+    usage = Counter(log.decks)
+    return {
+        "battles": n,
+        "wins": sum(wins),
+        "losses": sum(losses),
+        "draws": n - sum(wins) - sum(losses),
+        "by_type": by_type,
+        "avg_elixir": sum(deck_averages) / len(deck_averages) if deck_averages else None,
+        "top_cards": [(log.card_names[i], count) for i, count in usage.most_common(TOP_CARDS)],
+        "crowns_for": sum(log.team),
+        "crowns_against": sum(log.opponent),
+        "avg_crown_diff": sum(diffs) / n,
+    }
+
+
+class BattleStatsCache:
+    """Statistiques par joueur, gardées tant que le journal (source, taille, dernier combat) ne change pas."""
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self._stats: Dict[str, Tuple[Tuple[str, int, Optional[str], int], Dict[str, Any]]] = {}
+
+    def get(
+        self,
+        tag: str,
+        battles: Tuple[Battle, ...],
+        elixir_of: Callable[[str], Optional[float]],
+        version: int = 0,
+        source: str = "api",
+    ) -> Dict[str, Any]:
+        """`version` change quand la table des coûts change (rechargement de cartes_data.json).
+
+        `source` distingue le journal de l'API de l'historique local : pour un même dernier
+        combat, les deux ne couvrent pas les mêmes combats (le nombre aussi fait partie de la clé).
+        """
+        latest = battles[0].battle_time if battles else None
+        key = (source, len(battles), latest, version)
+        cached = self._stats.get(tag)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        stats = compute_stats(BattleColumns(battles), elixir_of)
+        if len(self._stats) >= self.maxsize:
+            self._stats.pop(next(iter(self._stats)))
+        self._stats[tag] = (key, stats)
+        return stats
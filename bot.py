@@ -3,9 +3,17 @@ import asyncio
 import logging
 import discord
 from discord.ext import commands
-from config import DISCORD_TOKEN, GUILD_IDS
+from config import DISCORD_TOKEN, GUILD_IDS, CR_PERSISTENT_CACHE
 import os # Nécessaire pour Render
-from db import init_db # <-- NÉCESSAIRE POUR LA DB
+from db import init_db, close_db # <-- NÉCESSAIRE POUR LA DB
+from cr_api import CRClient, PersistentResponseCache
+from card_catalog import CardCatalog
+from card_data import CardDataStore
+from history import SnapshotRecorder
+from river_prefetch import RiverRacePrefetcher
+from player_clans import PlayerClanCache
+from participation import ParticipationTracker
+from battle_ingest import BattleLogIngestor
 
 # --- AJOUTS POUR LE SERVEUR WEB RENDER ---
 from flask import Flask
@@ -37,6 +45,27 @@ intents.members = True
 intents.message_content = True # Gardé si vous utilisez des commandes préfixées
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+def create_services():
+    """Client API partagé et services de fond, attachés au bot avant le chargement des cogs."""
+    # Client API Clash Royale partagé, injecté dans les cogs via bot.cr
+    # Cache persistant (SQLite) optionnel : les réponses survivent aux redémarrages de Render
+    bot.cr = CRClient(persistent=PersistentResponseCache() if CR_PERSISTENT_CACHE else None)
+    # Catalogue des cartes officielles (icônes), rafraîchi en tâche de fond
+    bot.card_catalog = CardCatalog(bot.cr)
+    # Index de cartes_data.json (FR, alias, coûts), partagé par /carte et /profile stats
+    bot.cards = CardDataStore()
+    # Historique (trophées, dons...) des comptes liés et de leurs clans
+    bot.history = SnapshotRecorder(bot.cr)
+    # Joueur -> clan actuel, mis à jour par chaque profil/clan reçu de l'API
+    bot.player_clans = PlayerClanCache()
+    bot.cr.add_observer(bot.player_clans.observe)
+    # Participation (decks, points) par membre, mise à jour à chaque course fluviale reçue
+    bot.participation = ParticipationTracker()
+    # Clan + course fluviale des clans liés, gardés en mémoire pour /clan war-rankings
+    bot.river_races = RiverRacePrefetcher(bot.cr, bot.player_clans, bot.participation)
+    # Combats des comptes liés copiés dans SQLite (au-delà des 25 gardés par l'API)
+    bot.battle_ingest = BattleLogIngestor(bot.cr)
+
 async def load_cogs():
     # Utilisation des noms de fichiers que vous avez fournis
     extensions = [
@@ -73,15 +102,46 @@ async def main():
     # 1. Initialiser la base de données
     await init_db()
     logger.info("✅ Base de données initialisée.")
-    
-    # 2. Démarrer le serveur Web pour Render
-    keep_alive()
-    logger.info("🌐 Serveur Web (pour Render) démarré.")
-    
-    # 3. Démarrer le bot
-    await load_cogs()
-    # Nous utilisons bot.start() et laissons Flask dans le thread séparé
-    await bot.start(DISCORD_TOKEN)
+
+    # Tout ce qui suit est dans le try : un échec au démarrage ou à la connexion
+    # ferme quand même la DB, la session HTTP et les tâches de fond déjà lancées
+    try:
+        # 2. Démarrer le serveur Web pour Render
+        keep_alive()
+        logger.info("🌐 Serveur Web (pour Render) démarré.")
+
+        # 3. Créer puis ouvrir le client HTTP partagé vers l'API Clash Royale (avant les cogs)
+        create_services()
+        await bot.cr.start()
+        logger.info("✅ Client Clash Royale partagé prêt.")
+        await bot.card_catalog.start()
+        await bot.cards.start()
+        await bot.history.start()
+        await bot.river_races.start()
+        await bot.battle_ingest.start()
+
+        # 4. Démarrer le bot
+        await load_cogs()
+        # Nous utilisons bot.start() et laissons Flask dans le thread séparé
+        await bot.start(DISCORD_TOKEN)
+    finally:
+        if not bot.is_closed():
+            await bot.close()
+        # Services éventuellement absents si create_services() a échoué en route
+        for name in ("battle_ingest", "river_races", "history", "cards", "card_catalog"):
+            service = getattr(bot, name, None)
+            if service is not None:
+                await service.close()
+        if hasattr(bot, "cr"):
+            logger.info(f"📊 Cache API Clash Royale : {bot.cr.cache_stats()}")
+            logger.info(f"📊 Limiteur API Clash Royale : {bot.cr.rate_limiter.stats()}")
+            await bot.cr.close()
+            logger.info("🛑 Client Clash Royale fermé.")
+        if hasattr(bot, "participation"):
+            logger.info(f"📊 Cache joueur -> clan : {bot.player_clans.stats()}")
+            logger.info(f"📊 Suivi de participation : {bot.participation.stats()}")
+        await close_db()
+        logger.info("🛑 Base de données fermée.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+# card_catalog.py -- catalogue des cartes de l'API (/cards), indexé et persisté sur disque
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional, Dict, Any, List
+from background import BackgroundService
+from cr_api import CRClient, CRApiError, PRIORITY_BACKGROUND
+from config import CARD_CATALOG_PATH, CARD_CATALOG_REFRESH_INTERVAL
+
+logger = logging.getLogger("dh2.cards")
+
+
+class CardCatalog(BackgroundService):
+    """Catalogue des cartes officielles, chargé une fois puis rafraîchi en tâche de fond.
+
+    Les recherches (nom EN ou id) se font en mémoire, sans aucun appel réseau.
+    Une copie est gardée sur disque pour démarrer à chaud même si l'API est indisponible.
+    """
+
+    def __init__(
+        self,
+        cr: CRClient,
+        path: str = CARD_CATALOG_PATH,
+        refresh_interval: float = CARD_CATALOG_REFRESH_INTERVAL,
+    ):
+        super().__init__()
+        self.cr = cr
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.by_name: Dict[str, Dict[str, Any]] = {}
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        self.updated_at: float = 0.0 # Horodatage (epoch) de la dernière liste reçue de l'API
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    # --- Indexation ---
+    def _build_indexes(self, items: List[Dict[str, Any]]):
+        by_name = {c["name"].strip().lower(): c for c in items if c.get("name")}
+        by_id = {c["id"]: c for c in items if "id" in c}
+        # Remplacement en une fois : un lecteur ne voit jamais un index partiel
+        self.by_name, self.by_id = by_name, by_id
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Carte officielle par nom anglais (insensible à la casse)."""
+        return self.by_name.get(name.strip().lower())
+
+    def get_by_id(self, card_id: int) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(card_id)
+
+    def icon_url(self, name: str, size: str = "medium") -> Optional[str]:
+        card = self.get(name)
+        if not card:
+            return None
+        return card.get("iconUrls", {}).get(size)
+
+    # --- Persistance disque ---
+    def _read_file(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_file(self, payload: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path) # Écriture atomique
+
+    async def load_from_disk(self) -> bool:
+        try:
+            payload = await asyncio.to_thread(self._read_file)
+        except Exception as e:
+            logger.warning(f"⚠️ Catalogue de cartes illisible ({self.path}) : {e}")
+            return False
+        if not payload or not payload.get("items"):
+            return False
+        self._build_indexes(payload["items"])
+        self.updated_at = payload.get("updated_at", 0.0)
+        logger.info(f"✅ {len(self)} cartes chargées depuis {self.path}")
+        return True
+
+    # --- Rafraîchissement ---
+    async def refresh(self) -> bool:
+        """Recharge /cards depuis l'API, reconstruit les index et met à jour la copie disque."""
+        self.cr.cache.invalidate("/cards") # On veut la liste fraîche, pas la copie en cache
+        try:
+            items = await self.cr.get_cards(priority=PRIORITY_BACKGROUND)
+        except CRApiError as e:
+            logger.warning(f"⚠️ Rafraîchissement du catalogue de cartes impossible : {e}")
+            return False
+        if not items:
+            return False
+        self._build_indexes(items)
+        self.updated_at = time.time()
+        try:
+            await asyncio.to_thread(self._write_file, {"updated_at": self.updated_at, "items": items})
+        except OSError as e:
+            logger.warning(f"⚠️ Impossible d'écrire {self.path} : {e}")
+        logger.info(f"🔄 Catalogue de cartes rafraîchi ({len(self)} cartes).")
+        return True
+
+    async def _run(self):
+        while True:
+            age = time.time() - self.updated_at
+            await asyncio.sleep(max(0.0, self.refresh_interval - age))
+            if not await self.refresh():
+                # Nouvel essai plus tôt en cas d'échec (API indisponible)
+                await asyncio.sleep(min(self.refresh_interval, 600))
+
+    async def start(self):
+        """Démarrage à chaud depuis le disque, puis API si la copie est absente ou périmée."""
+        await self.load_from_disk()
+        if not self.by_id or time.time() - self.updated_at >= self.refresh_interval:
+            await self.refresh()
+        await super().start()
@@ -0,0 +1,79 @@
+# card_data.py -- cartes_data.json (noms FR, alias, coûts) indexé en mémoire et rechargé à chaud
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List
+from background import BackgroundService
+from card_index import CardIndex
+from config import CARDS_DATA_POLL_INTERVAL
+
+logger = logging.getLogger("dh2.cards")
+
+CARDS_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cartes_data.json")
+
+
+class CardDataStore(BackgroundService):
+    """Index de cartes_data.json partagé par les cogs (/carte, /profile stats).
+
+    Le fichier est surveillé toutes les `poll_interval` secondes (0 = jamais) : le nouvel
+    index est construit dans un thread, puis remplace l'ancien en une seule affectation.
+    """
+
+    def __init__(self, path: str = CARDS_DATA_PATH, poll_interval: float = CARDS_DATA_POLL_INTERVAL):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.data_mtime = self._mtime()
+        self.index = CardIndex(self.load_cards_data()) # Recherche FR/EN/alias (remplacée d'un bloc au rechargement)
+
+    # --- Chargement ---
+    def load_cards_data(self) -> List[Dict[str, Any]]:
+        """Charge la liste des cartes depuis cartes_data.json (indexée ensuite par CardIndex)."""
+        cards = []
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cards = json.load(f)
+                print(f"✅ {len(cards)} cartes chargées avec alias depuis cartes_data.json")
+        except Exception as e:
+            print(f"⚠️ Erreur de chargement du fichier cartes_data.json : {e}")
+
+        return cards
+
+    # --- Rechargement à chaud ---
+    def _mtime(self) -> float:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return 0.0
+
+    def _build_index(self) -> CardIndex:
+        """Lecture + construction complète, exécutée dans un thread (lève une erreur si le JSON est invalide)."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            return CardIndex(json.load(f))
+
+    async def reload(self) -> bool:
+        started = time.perf_counter()
+        try:
+            index = await asyncio.to_thread(self._build_index)
+        except Exception as e:
+            # Fichier en cours d'écriture ou invalide : l'ancien index reste en place
+            logger.warning(f"⚠️ Rechargement de cartes_data.json ignoré : {e}")
+            return False
+        self.index = index # Remplacement atomique : un appel en cours garde l'index qu'il a lu
+        logger.info(f"🔄 cartes_data.json rechargé : {len(index)} cartes indexées en {(time.perf_counter() - started) * 1000:.0f} ms.")
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            mtime = self._mtime()
+            if mtime and mtime != self.data_mtime:
+                self.data_mtime = mtime
+                await self.reload()
+
+    async def start(self):
+        if self.poll_interval > 0:
+            await super().start()
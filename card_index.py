@@ -0,0 +1,228 @@
+# card_index.py -- index de recherche des cartes locales (cartes_data.json) pour /carte
+import itertools
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+from discord import app_commands
+
+MAX_CHOICES = 25 # Limite Discord pour l'auto-complétion
+
+# Rangs de pertinence (plus petit = meilleur)
+RANK_EXACT = 0       # Nom FR/EN ou alias identique
+RANK_PREFIX = 1      # Début du nom ou de l'alias
+RANK_WORD_PREFIX = 2 # Début d'un mot du nom ("feu" -> "Boule de feu")
+RANK_SUBSTRING = 3   # N'importe où dans le nom
+
+MAX_SUGGESTIONS = 3    # « Tu voulais dire » : alternatives proposées
+FUZZY_MIN_SCORE = 0.5  # Similarité cosinus (trigrammes) minimale pour accepter une carte
+FUZZY_MIN_LENGTH = 4   # Saisie plus courte : jamais de correction automatique
+FUZZY_MIN_MARGIN = 0.15 # Avance minimale de la meilleure carte sur la deuxième
+SUGGEST_MIN_SCORE = 0.25
+DEFAULT_THUMBNAIL = "https://cdn.discordapp.com/emojis/1189420413190334555.webp?size=96&quality=lossless"
+
+_SEPARATORS = re.compile(r"[^0-9a-z]+")
+_GENERATIONS = itertools.count(1) # Numéro de génération des index (croissant, jamais réutilisé)
+
+
+def fold(text: str) -> str:
+    """Forme normalisée pour la recherche : minuscules, sans accents ni ponctuation.
+
+    "Bûcheron" -> "bucheron", "P.E.K.K.A" -> "pekka", "Electro-sorcier" -> "electro sorcier".
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace(".", "").replace("'", "").replace("’", "")
+    return _SEPARATORS.sub(" ", text).strip()
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _padded_trigrams(text: str) -> Set[str]:
+    """Trigrammes avec bordures ("  g", " go", ...) : le début et la fin du mot comptent aussi."""
+    return _trigrams(f"  {text} ")
+
+
+class _TrieNode:
+    __slots__ = ("children", "ranks")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ranks: Dict[int, int] = {} # id de carte -> meilleur rang pour ce préfixe
+
+
+def card_embed_payload(c: Dict[str, Any]) -> Dict[str, Any]:
+    """Embed /carte d'une carte, sous forme de dict (discord.Embed.from_dict), sans vignette."""
+    evolution = c["evolution"]
+    if evolution == "coming soon":
+        evolution_text = "Coming Soon ⌛"
+    else:
+        evolution_text = "Oui ✅" if evolution else "Non ❌"
+    fields = [
+        ("💧 Élixir", str(c["cout_elixir"])),
+        ("🏅 Rareté", c["rarete"]),
+        ("⚔️ Type", c["type"]),
+        ("🔄 Évolution", evolution_text),
+        ("🔣 Alias", c["alias"]),
+    ]
+    return {
+        "type": "rich",
+        "title": f"{c['nom_fr']} ({c['nom_en']})",
+        "color": 0x00A2E8,
+        "fields": [{"name": name, "value": value, "inline": True} for name, value in fields],
+    }
+
+
+class CardIndex:
+    """Index immuable construit une fois au chargement de cartes_data.json.
+
+    - exact : nom FR/EN/alias normalisé -> carte
+    - trie de préfixes (noms complets et débuts de mots), avec le rang de chaque carte
+    - postings de trigrammes pour les recherches « contient »
+    - app_commands.Choice préconstruits, un par carte (doublons du fichier écartés)
+    Jamais modifié après construction : un rechargement construit une nouvelle instance.
+    """
+
+    def __init__(self, cards: List[Dict[str, Any]]):
+        # Une carte listée deux fois (même nom affiché) n'est indexée qu'une fois
+        unique: Dict[str, Dict[str, Any]] = {}
+        for c in cards:
+            unique.setdefault(f"{c['nom_fr']} ({c['nom_en']})", c)
+        self.cards = list(unique.values())
+        self.generation = next(_GENERATIONS) # Identifie cet index dans les caches dérivés (stats...)
+        self.exact: Dict[str, Dict[str, Any]] = {}
+        self._exact_ids: Dict[str, Set[int]] = {}
+        self.choices: List[app_commands.Choice] = []
+        self.embeds: Dict[str, Dict[str, Any]] = {} # nom FR -> payload d'embed précalculé
+        self._sort_keys: List[str] = []
+        self._keys: List[Tuple[str, ...]] = [] # id -> clés normalisées (FR, EN, alias)
+        self._trie = _TrieNode()
+        self._trigrams: Dict[str, Set[int]] = {}
+        # Recherche tolérante aux fautes : trigrammes bordés de chaque clé -> clés
+        self._fuzzy_keys: List[Tuple[str, int, int]] = [] # (clé, id de carte, nb de trigrammes)
+        self._fuzzy_postings: Dict[str, List[int]] = {}
+        self._results: Dict[str, List[app_commands.Choice]] = {} # Requêtes déjà calculées
+
+        for card_id, c in enumerate(self.cards):
+            display = f"{c['nom_fr']} ({c['nom_en']})"
+            self.choices.append(app_commands.Choice(name=f"{display} [{c['alias']}]", value=c["nom_fr"]))
+            self.embeds[c["nom_fr"]] = card_embed_payload(c)
+            self._sort_keys.append(fold(display))
+            keys = tuple(dict.fromkeys(fold(c[k]) for k in ("nom_fr", "nom_en", "alias") if c.get(k)))
+            self._keys.append(keys)
+            for key in keys:
+                self.exact.setdefault(key, c)
+                self._exact_ids.setdefault(key, set()).add(card_id)
+                grams = _padded_trigrams(key)
+                for gram in grams:
+                    self._fuzzy_postings.setdefault(gram, []).append(len(self._fuzzy_keys))
+                self._fuzzy_keys.append((key, card_id, len(grams)))
+                self._insert(key, card_id, RANK_PREFIX)
+                for match in re.finditer(r" (?=\S)", key):
+                    self._insert(key[match.end():], card_id, RANK_WORD_PREFIX)
+                for gram in _trigrams(key):
+                    self._trigrams.setdefault(gram, set()).add(card_id)
+        self._all = sorted(range(len(self.cards)), key=self._sort_keys.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def embed_payload(self, card: Dict[str, Any]) -> Dict[str, Any]:
+        return self.embeds[card["nom_fr"]]
+
+    def _insert(self, key: str, card_id: int, rank: int):
+        node = self._trie
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+            if rank < node.ranks.get(card_id, RANK_SUBSTRING + 1):
+                node.ranks[card_id] = rank
+
+    # --- Recherche ---
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Carte dont le nom FR, EN ou l'alias correspond exactement (accents et casse ignorés)."""
+        return self.exact.get(fold(name))
+
+    def fuzzy(self, name: str, min_score: float = FUZZY_MIN_SCORE) -> List[Tuple[float, Dict[str, Any]]]:
+        """Cartes proches de `name` (similarité cosinus des trigrammes), de la plus proche à la plus lointaine.
+
+        Seules les clés qui partagent au moins un trigramme avec la requête sont visitées.
+        """
+        grams = _padded_trigrams(fold(name))
+        if not grams:
+            return []
+        common: Dict[int, int] = {}
+        for gram in grams:
+            for key_id in self._fuzzy_postings.get(gram, ()):
+                common[key_id] = common.get(key_id, 0) + 1
+        best: Dict[int, float] = {} # id de carte -> meilleur score parmi ses clés
+        for key_id, shared in common.items():
+            _, card_id, size = self._fuzzy_keys[key_id]
+            score = shared / (len(grams) * size) ** 0.5
+            if score >= min_score and score > best.get(card_id, 0.0):
+                best[card_id] = score
+        ranked = sorted(best.items(), key=lambda item: (-item[1], self._sort_keys[item[0]]))
+        return [(score, self.cards[card_id]) for card_id, score in ranked]
+
+    def resolve(self, name: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]], bool]:
+        """(carte retenue, suggestions, correspondance exacte).
+
+        Exact d'abord. Sinon la carte la plus proche n'est retenue que si la saisie est assez
+        longue, n'est pas le début du nom de plusieurs cartes (« dragon », « tour »...) et que
+        son score dépasse FUZZY_MIN_SCORE avec FUZZY_MIN_MARGIN d'avance sur la suivante.
+        Les suggestions (« tu voulais dire ») viennent de la recherche floue élargie, puis de
+        l'index de préfixes.
+        """
+        card = self.get(name)
+        if card is not None:
+            return card, [], True
+        query = fold(name)
+        close = self.fuzzy(name, SUGGEST_MIN_SCORE)
+        suggestions = [c for _, c in close[:1 + MAX_SUGGESTIONS]]
+        if close and close[0][0] >= FUZZY_MIN_SCORE and len(query.replace(" ", "")) >= FUZZY_MIN_LENGTH:
+            runner_up = close[1][0] if len(close) > 1 else 0.0
+            prefixed = sum(1 for rank in self._rank(query).values() if rank <= RANK_WORD_PREFIX)
+            if close[0][0] - runner_up >= FUZZY_MIN_MARGIN and prefixed <= 1:
+                return close[0][1], suggestions[1:], False
+        if not suggestions:
+            suggestions = [self.cards[i] for i in self.search(name, MAX_SUGGESTIONS)]
+        return None, suggestions[:MAX_SUGGESTIONS], False
+
+    def _rank(self, query: str) -> Dict[int, int]:
+        ranks: Dict[int, int] = {}
+        node = self._trie
+        for ch in query:
+            node = node.children.get(ch)
+            if node is None:
+                break
+        else:
+            ranks.update(node.ranks)
+        if len(query) >= 3:
+            # Candidats « contient » : intersection des postings, puis vérification
+            candidates = set.intersection(*(self._trigrams.get(g, set()) for g in _trigrams(query)))
+        else:
+            candidates = range(len(self.cards)) # 1-2 caractères : pas de trigramme, liste courte
+        for card_id in candidates:
+            if card_id not in ranks and any(query in key for key in self._keys[card_id]):
+                ranks[card_id] = RANK_SUBSTRING
+        for card_id in self._exact_ids.get(query, ()):
+            ranks[card_id] = RANK_EXACT
+        return ranks
+
+    def search(self, query: str, limit: int = MAX_CHOICES) -> List[int]:
+        """Ids de cartes triés par pertinence (exact > préfixe > début de mot > contient)."""
+        query = fold(query)
+        if not query:
+            return self._all[:limit]
+        ranks = self._rank(query)
+        # À rang égal : le nom le plus court (le plus proche de la saisie) d'abord
+        return sorted(ranks, key=lambda i: (ranks[i], len(self._sort_keys[i]), self._sort_keys[i]))[:limit]
+
+    def autocomplete(self, current: str) -> List[app_commands.Choice]:
+        """Choices prêts à renvoyer à Discord (résultat mémorisé par requête normalisée)."""
+        query = fold(current)
+        results = self._results.get(query)
+        if results is None:
+            results = [self.choices[i] for i in self.search(query)]
+            if len(self._results) < 4096:
+                self._results[query] = results
+        return results
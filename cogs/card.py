@@ -1,72 +1,24 @@
 # cogs/card.py
-import json
-import os
 from discord.ext import commands
 from discord import app_commands
 import discord
-from cr_api import CRClient, CRApiError
+from card_catalog import CardCatalog
+from card_data import CardDataStore
+from card_index import DEFAULT_THUMBNAIL
 
 
 class CardCog(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, catalog: CardCatalog, cards: CardDataStore):
         self.bot = bot
-        self.cr = CRClient()
-        self.cards_data = self.load_cards_data()
-
-    # -------------------------------
-    # 🔹 Chargement des données locales
-    # -------------------------------
-    def load_cards_data(self):
-        """Charge les données depuis cartes_data.json et indexe par nom FR, EN et alias."""
-        base_dir = os.path.dirname(os.path.dirname(__file__))
-        path = os.path.join(base_dir, "data", "cartes_data.json")
-        cards = {}
-
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for c in data:
-                    # Indexe par nom FR, EN et alias
-                    keys = {
-                        c["nom_fr"].lower(),
-                        c["nom_en"].lower(),
-                        c["alias"].lower()
-                    }
-                    for k in keys:
-                        cards[k] = c
-                print(f"✅ {len(data)} cartes chargées avec alias depuis cartes_data.json")
-        except Exception as e:
-            print(f"⚠️ Erreur de chargement du fichier cartes_data.json : {e}")
-
-        return cards
+        self.catalog = catalog # Catalogue officiel (icônes), injecté depuis bot.main
+        self.cards = cards     # Index de cartes_data.json (rechargé à chaud), injecté depuis bot.main
 
     # -------------------------------
     # 🔹 Auto-complétion Discord
     # -------------------------------
     async def card_autocomplete(self, interaction: discord.Interaction, current: str):
-        """Suggestions FR, EN et alias pour la commande /carte"""
-        current_lower = current.lower()
-        results = []
-
-        added = set()
-        for _, card in self.cards_data.items():
-            nom_fr = card["nom_fr"]
-            nom_en = card["nom_en"]
-            alias = card["alias"]
-
-            # Crée une ligne d'affichage
-            display = f"{nom_fr} ({nom_en})"
-            if current_lower in nom_fr.lower() or current_lower in nom_en.lower() or current_lower in alias.lower():
-                if display not in added:
-                    results.append(
-                        app_commands.Choice(name=f"{display} [{alias}]", value=nom_fr)
-                    )
-                    added.add(display)
-
-            if len(results) >= 25:
-                break
-
-        return results
+        """Suggestions FR, EN et alias pour la commande /carte (index préconstruit, sans parcours)"""
+        return self.cards.index.autocomplete(current)
 
     # -------------------------------
     # 🔹 Slash Command : /carte
@@ -77,53 +29,42 @@ class CardCog(commands.Cog):
     async def carte(self, interaction: discord.Interaction, nom: str):
         await interaction.response.defer()
 
-        nom_lower = nom.lower()
-        card_info = self.cards_data.get(nom_lower)
-
-        # Recherche tolérante si l'utilisateur tape un nom proche
-        if not card_info:
-            for key, c in self.cards_data.items():
-                if nom_lower in [c["nom_fr"].lower(), c["nom_en"].lower(), c["alias"].lower()]:
-                    card_info = c
-                    break
+        index = self.cards.index # Une seule lecture : même index pour toute la commande
+        # Nom FR, EN ou alias (casse, accents et ponctuation ignorés), sinon le plus proche s'il est sans ambiguïté
+        card_info, suggestions, exact = index.resolve(nom)
 
         if not card_info:
-            await interaction.followup.send(
-                f"❌ Carte « {nom} » introuvable dans la base locale.", ephemeral=True
+            embed = discord.Embed(
+                title="❌ Carte introuvable",
+                description=f"Aucune carte ne correspond à « {nom} » dans la base locale.",
+                color=0xE74C3C,
             )
+            if suggestions:
+                embed.add_field(
+                    name="💡 Tu voulais dire",
+                    value="\n".join(f"• {c['nom_fr']} ({c['nom_en']})" for c in suggestions),
+                    inline=False,
+                )
+            await interaction.followup.send(embed=embed, ephemeral=True)
             return
 
-        # Récupération image API
-        try:
-            card_api = await self.cr.get_card(card_info["nom_en"])
-        except CRApiError:
-            card_api = {}
-
-        embed = discord.Embed(
-            title=f"{card_info['nom_fr']} ({card_info['nom_en']})",
-            color=0x00A2E8,
-        )
-        embed.add_field(name="💧 Élixir", value=str(card_info["cout_elixir"]), inline=True)
-        embed.add_field(name="🏅 Rareté", value=card_info["rarete"], inline=True)
-        embed.add_field(name="⚔️ Type", value=card_info["type"], inline=True)
-        embed.add_field(
-            name="🔄 Évolution", value="Oui ✅" if card_info["evolution"] else "Coming Soon ⌛" if card_info["evolution"] == "coming soon" else "Non ❌", inline=True
-        )
-        embed.add_field(name="🔣 Alias", value=card_info["alias"], inline=True)
-
-        icon_url = card_api.get("iconUrls", {}).get("medium")
-        if icon_url:
-            embed.set_thumbnail(url=icon_url)
-        else:
-            embed.set_thumbnail(
-                url="https://cdn.discordapp.com/emojis/1189420413190334555.webp?size=96&quality=lossless"
-            )
-
+        # Embed précalculé au chargement de cartes_data.json
+        embed = discord.Embed.from_dict(index.embed_payload(card_info))
+        if not exact:
+            # Carte devinée : on le signale et on propose les autres candidates
+            embed.description = f"Carte la plus proche de « {nom} »."
+            if suggestions:
+                embed.add_field(
+                    name="💡 Tu voulais dire",
+                    value="\n".join(f"• {c['nom_fr']} ({c['nom_en']})" for c in suggestions),
+                    inline=False,
+                )
+
+        # Icône : URL du CDN tenue par le catalogue (Discord la charge lui-même, aucun appel réseau ici)
+        embed.set_thumbnail(url=self.catalog.icon_url(card_info["nom_en"]) or DEFAULT_THUMBNAIL)
         await interaction.followup.send(embed=embed)
 
-    async def cog_unload(self):
-        await self.cr.close()
 
 
 async def setup(bot):
-    await bot.add_cog(CardCog(bot))
+    await bot.add_cog(CardCog(bot, bot.card_catalog, bot.cards))
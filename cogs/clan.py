@@ -2,17 +2,29 @@
 from discord.ext import commands
 from discord import app_commands
 import discord
-from cr_api import CRClient, CRApiError
+from cr_api import CRClient, CRApiError, Participant, is_stale, dash, STALE_NOTICE
+from river_prefetch import RiverRacePrefetcher, CURRENT_RACE, LAST_RACE
+from player_clans import PlayerClanCache
+from participation import ParticipationTracker, remaining_decks, MAX_DECK_SLOTS
 # --- Import Corrigé (DB) ---
-from db import get_user_tag # Utilise la DB asynchrone
+from db import get_user_tag, get_discord_ids_for_tags # Utilise la DB asynchrone
 # import os et import json supprimés car non nécessaires avec l'approche DB/API asynchrone
-from typing import List, Dict, Any
-from operator import itemgetter 
+from typing import Dict, List, Tuple
+from operator import attrgetter, itemgetter
+
+
+def _mentions(discord_ids: List[int] | None) -> str:
+    """Mentions des comptes Discord liés à un joueur (chaîne vide si aucun)."""
+    return "".join(f" <@{i}>" for i in discord_ids) if discord_ids else ""
 
 
 class Clan(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, cr: CRClient, river: RiverRacePrefetcher, player_clans: PlayerClanCache, participation: ParticipationTracker):
         self.bot = bot
+        self.cr = cr # Client API partagé (injecté depuis bot.main)
+        self.river = river # Courses fluviales préchargées des clans liés
+        self.player_clans = player_clans # Joueur -> clan actuel (évite un /players par commande)
+        self.participation = participation # Decks/points par membre, tenus à jour à chaque course reçue
 
     # --- DÉCLARATION DU GROUPE DE COMMANDES /clan (Correction de l'omission) ---
     clan_group = app_commands.Group(name="clan", description="Commandes liées au clan Clash Royale.")
@@ -32,14 +44,8 @@ class Clan(commands.Cog):
             return None 
 
         try:
-            # 3. Récupère les infos du joueur pour trouver son clan (via nouvelle API)
-            async with CRClient() as cr:
-                player = await cr.get_player(user_tag)
-                
-            clan_info = player.get("clan")
-            if clan_info:
-                return clan_info.get("tag", "").strip("#").upper()
-            return None # Le joueur n'est dans aucun clan
+            # 3. Clan du joueur : cache mémoire, sinon /players (None si le joueur n'a pas de clan)
+            return await self.player_clans.resolve(self.cr, user_tag)
         except Exception:
             # Échoue silencieusement si le joueur n'est pas trouvé ou s'il y a une erreur API
             return None
@@ -62,34 +68,34 @@ class Clan(commands.Cog):
             return
             
         try:
-            # 2. MIGRATION API
-            async with CRClient() as cr:
-                clan = await cr.get_clan(clan_tag)
-                
+            # 2. API (client partagé)
+            clan = await self.cr.get_clan(clan_tag)
         except CRApiError as e:
             await interaction.followup.send(f"❌ Erreur Clash Royale : {e}", ephemeral=True)
             return
         
-        clan_tag_display = clan.get("tag", clan_tag) 
+        clan_tag_display = clan.tag or clan_tag 
 
         # --- Embed final ---
         embed = discord.Embed(
-            title=f"🛡️ {clan.get('name', '—')}",
-            description=clan.get("description", "—"),
+            title=f"🛡️ {dash(clan.name)}",
+            description=dash(clan.description),
             color=0xFFD700,
         )
         embed.add_field(name="🔖 Tag", value=f"`{clan_tag_display}`", inline=True)
-        embed.add_field(name="🎯 Conditions d’entrée", value=f"{clan.get('requiredTrophies', '—')} 🏆", inline=True)
-        embed.add_field(name="👥 Membres", value=f"{clan.get('members', 0)}/50 👤", inline=True)
-        embed.add_field(name="🏆 Trophées", value=f"{clan.get('clanScore', '—')} 🏆", inline=True)
-        embed.add_field(name="⚔️ Trophées de guerre", value=f"{clan.get('clanWarTrophies', '—')} ⚔️", inline=True)
-        embed.add_field(name="🌎 Localisation", value=clan.get('location', {}).get('name', '—'), inline=True)
+        embed.add_field(name="🎯 Conditions d’entrée", value=f"{dash(clan.required_trophies)} 🏆", inline=True)
+        embed.add_field(name="👥 Membres", value=f"{clan.members_count}/50 👤", inline=True)
+        embed.add_field(name="🏆 Trophées", value=f"{dash(clan.clan_score)} 🏆", inline=True)
+        embed.add_field(name="⚔️ Trophées de guerre", value=f"{dash(clan.clan_war_trophies)} ⚔️", inline=True)
+        embed.add_field(name="🌎 Localisation", value=dash(clan.location_name), inline=True)
         
-        badge_url = clan.get('badgeUrls', {}).get('large')
-        if badge_url:
-            embed.set_thumbnail(url=badge_url)
+        if clan.badge_url:
+            embed.set_thumbnail(url=clan.badge_url)
             
-        embed.set_footer(text="Utilise /clan donations ou /clan war-rankings pour plus d'infos.")
+        footer = "Utilise /clan donations ou /clan war-rankings pour plus d'infos."
+        if is_stale(clan):
+            footer += f" {STALE_NOTICE}"
+        embed.set_footer(text=footer)
 
         await interaction.followup.send(embed=embed)
 
@@ -110,34 +116,40 @@ class Clan(commands.Cog):
             return
 
         try:
-            async with CRClient() as cr:
-                clan = await cr.get_clan(clan_tag)
-                
+            clan = await self.cr.get_clan(clan_tag)
         except CRApiError as e:
             await interaction.followup.send(f"❌ Erreur Clash Royale : {e}", ephemeral=True)
             return
 
-        members = clan.get("memberList", [])
+        members = clan.members
         if not members:
-            await interaction.followup.send(f"ℹ️ Le clan `{clan.get('name', clan_tag)}` ne contient aucun membre.")
+            await interaction.followup.send(f"ℹ️ Le clan `{clan.name or clan_tag}` ne contient aucun membre.")
             return
 
         # Trie par donations (du plus grand au plus petit)
-        sorted_members = sorted(members, key=itemgetter("donations"), reverse=True)
+        sorted_members = sorted(members, key=attrgetter("donations"), reverse=True)
+
+        top_members = sorted_members[:25] # Limité à 25 pour l'embed
+        # Comptes Discord liés : une seule requête pour tout le top
+        linked = await get_discord_ids_for_tags(m.tag for m in top_members)
 
         rankings = []
-        for i, member in enumerate(sorted_members[:25], 1): # Limité à 25 pour l'embed
-            name = member.get("name", "Anonyme")
-            donations = member.get("donations", 0)
-            role = member.get("role", "Membre").title() 
-            rankings.append(f"**{i}.** {name} *({role})*: **{donations}** 🃏")
+        for i, member in enumerate(top_members, 1):
+            name = member.name or "Anonyme"
+            donations = member.donations
+            role = (member.role or "Membre").title() 
+            mention = _mentions(linked.get(member.tag.strip("#").upper()))
+            rankings.append(f"**{i}.** {name}{mention} *({role})*: **{donations}** 🃏")
 
         embed = discord.Embed(
-            title=f"🥇 Classement des Dons - {clan.get('name', '—')}",
+            title=f"🥇 Classement des Dons - {dash(clan.name)}",
             description="\n".join(rankings),
             color=0x4CAF50 
         )
-        embed.set_footer(text=f"Total des membres : {len(members)}. Affichage du Top 25.")
+        footer = f"Total des membres : {len(members)}. Affichage du Top 25."
+        if is_stale(clan):
+            footer += f" {STALE_NOTICE}"
+        embed.set_footer(text=footer)
         
         await interaction.followup.send(embed=embed)
 
@@ -155,97 +167,81 @@ class Clan(commands.Cog):
             await interaction.followup.send("⚠️ Tu dois lier ton compte Discord à un compte Clash Royale avec un clan, ou fournir le tag du clan.", ephemeral=True)
             return
 
-        clan_name = None 
-        current_status = None
-        standings = []
-        participants = []
-        clan: Dict[str, Any] = {}
-
-        try:
-            async with CRClient() as cr:
-                clan = await cr.get_clan(clan_tag)
-                clan_name = clan.get('name', clan_tag)
-                
-                try:
-                    # 1. Tente d'obtenir la Course Fluviale ACTUELLE
-                    war_data = await cr.get_current_river_race(clan_tag)
-                    current_status = "Course Fluviale Actuelle"
-                    standings = war_data.get('clans', [])
-                    our_clan_data = next((c for c in standings if c['tag'].strip('#').upper() == clan_tag), None)
-                    participants = our_clan_data.get('participants', []) if our_clan_data else []
-                    
-                except CRApiError as e_current:
-                    # 2. Si échec (Not found), vérifie le log des guerres terminées
-                    if "Not found" in str(e_current) or e_current.args[0].endswith("404: Not found: /clans/%23..."):
-                        war_log_list = await cr.get_clan_war_log(clan_tag)
-                        latest_war = war_log_list[0] if war_log_list else None
-                        current_status = "Dernière Course Fluviale Terminée"
-                        if latest_war and latest_war.get('standings'):
-                            standings = latest_war['standings']
-                            participants = latest_war.get('participants', [])
-                        else:
-                            # Ne lève plus l'erreur, mais envoie un message d'information
-                            await interaction.followup.send(
-                                f"ℹ️ Aucune donnée de Course Fluviale actuelle ou passée trouvée pour le clan {clan_name} (`#{clan_tag}`).",
-                                ephemeral=True
-                            )
-                            return
-                    else:
-                        raise e_current
-
-        except CRApiError as e:
-            error_message = str(e)
+        # 1. Instantané préchargé (clans liés), sinon appels API en parallèle
+        war = self.river.get(clan_tag)
+        if war is None:
+            try:
+                war = await self.river.fetch(clan_tag)
+            except CRApiError as e:
+                error_message = str(e)
+                await interaction.followup.send(
+                    f"❌ **Erreur : Données de Guerre Introuvables**\n"
+                    f"Une erreur s'est produite lors de la connexion à l'API : `{error_message}`.",
+                    ephemeral=True
+                )
+                return
+
+        clan = war.clan # None si /clans n'a pas répondu (résultat partiel)
+        current_status = war.status
+        standings = war.standings
+        participants = war.participants
+        stale = war.stale # Vrai si une des réponses vient du cache de secours
+        race_error = war.errors.get("race") # Course fluviale inaccessible : classement et participation absents
+        own_standing = next((c for c in standings if c.tag.strip("#").upper() == clan_tag), None)
+        clan_name = (clan.name if clan else None) or (own_standing.name if own_standing else None) or clan_tag
+
+        if not standings and not race_error and war.status == LAST_RACE:
             await interaction.followup.send(
-                f"❌ **Erreur : Données de Guerre Introuvables**\n"
-                f"Une erreur s'est produite lors de la connexion à l'API : `{error_message}`.",
+                f"ℹ️ Aucune donnée de Course Fluviale actuelle ou passée trouvée pour le clan {clan_name} (`#{clan_tag}`).",
                 ephemeral=True
             )
             return
 
-        if not standings:
+        if not standings and not race_error:
             await interaction.followup.send(f"ℹ️ Le classement n'est pas disponible pour `{clan_name}`. Réessayez plus tard.", ephemeral=True)
             return
 
         # 1. CLASSEMENT
-        try:
-            sorted_standings = sorted(standings, key=itemgetter("fame"), reverse=True)
-        except KeyError:
-            sorted_standings = standings
-        ranking_lines = []
+        sorted_standings = sorted(standings, key=attrgetter("fame"), reverse=True)
+        ranking_lines = [f"⚠️ Classement indisponible : `{race_error}`"] if race_error else []
         for i, rank_data in enumerate(sorted_standings, 1):
-            rank = i; clan_name_standing = rank_data.get('name', 'Inconnu'); fame = rank_data.get('fame', 0) 
-            name_display = f"**{clan_name_standing}**" if rank_data.get('tag', '').strip('#').upper() == clan_tag else clan_name_standing
+            rank = i; clan_name_standing = rank_data.name or 'Inconnu'; fame = rank_data.fame 
+            name_display = f"**{clan_name_standing}**" if rank_data.tag.strip('#').upper() == clan_tag else clan_name_standing
             ranking_lines.append(f"{rank}. {name_display} : **{fame}** Points 🏅")
         
-        # 2. PARTICIPATION
-        FAME_PER_DECK = 750; MAX_DECK_SLOTS = 4
-        clan_members_list: List[Dict[str, Any]] = clan.get('memberList', [])
-        participants_stats: Dict[str, Any] = {p['tag'].strip("#").upper(): p for p in participants} 
-        remaining_decks_list_raw = []
-        for member_data in clan_members_list:
-            tag_normalized = member_data['tag'].strip("#").upper(); name = member_data['name']
-            stats = participants_stats.get(tag_normalized); fame_gained = 0; decks_remaining = MAX_DECK_SLOTS
-            if stats:
-                fame_gained = stats.get('fame', 0); decks_used_api = stats.get('decksUsed')
-                if decks_used_api is not None:
-                    decks_remaining = MAX_DECK_SLOTS - decks_used_api
-                else:
-                    estimated_decks_played = min(MAX_DECK_SLOTS, fame_gained // FAME_PER_DECK)
-                    decks_remaining = MAX_DECK_SLOTS - estimated_decks_played
-                decks_remaining = max(0, min(MAX_DECK_SLOTS, decks_remaining))
+        # 2. PARTICIPATION (champs typés : tri sur les decks restants, mise en forme à la fin)
+        participants_stats: Dict[str, Participant] = {p.tag.strip("#").upper(): p for p in participants} 
+        # Course actuelle : suivi incrémental (au moins aussi récent que l'instantané)
+        tracked = self.participation.get(clan_tag) if current_status == CURRENT_RACE else {}
+        # Sans /clans, les participants de la course servent de liste de membres
+        members = () if race_error else (clan.members if clan else participants)
+        linked = await get_discord_ids_for_tags(m.tag for m in members) # Une requête pour tout le clan
+        remaining_rows: List[Tuple[int, int, str, str]] = [] # (decks restants, points, nom, tag)
+        for member_data in members:
+            tag_normalized = member_data.tag.strip("#").upper()
+            stats = tracked.get(tag_normalized) or participants_stats.get(tag_normalized)
+            fame_gained = stats.fame if stats else 0
+            decks_remaining = remaining_decks(stats.decks_used_today, stats.decks_used, stats.fame) if stats else MAX_DECK_SLOTS
             if decks_remaining > 0:
-                warning_emoji = " ⚠️" if fame_gained == 0 else "" 
-                remaining_decks_list_raw.append(
-                    f"**{name}** : {decks_remaining} deck(s) restant(s) (Points : {fame_gained} 🏅){warning_emoji}"
-                )
-        def robust_sort_key(x: str) -> int:
-            try:
-                start_index = x.find(':') + 1; end_index = x.find(' deck')
-                if start_index != -1 and end_index != -1 and start_index < end_index:
-                    return int(x[start_index:end_index].strip())
-                return 0 
-            except ValueError: return 0 
-        remaining_decks_list_raw.sort(key=robust_sort_key, reverse=True)
+                remaining_rows.append((decks_remaining, fame_gained, member_data.name, tag_normalized))
+        remaining_rows.sort(key=itemgetter(0), reverse=True)
+        remaining_decks_list_raw = [
+            f"**{name}**{_mentions(linked.get(tag_normalized))} : {decks_remaining} deck(s) restant(s) (Points : {fame_gained} 🏅)"
+            f"{' ⚠️' if fame_gained == 0 else ''}"
+            for decks_remaining, fame_gained, name, tag_normalized in remaining_rows
+        ]
+
+        # 3. ACTIVITÉ DEPUIS LA DERNIÈRE CONSULTATION DE CET UTILISATEUR (None à sa première consultation)
+        changes = None
+        if current_status == CURRENT_RACE and not race_error:
+            changes = self.participation.changes_since_check(clan_tag, interaction.user.id)
+        activity_lines = []
+        for record, decks_played, fame_won in changes or ():
+            line = f"**{record.name or record.tag}** : +{decks_played} deck(s), +{fame_won} 🏅"
+            if sum(len(l) + 1 for l in activity_lines) + len(line) > 1000:
+                activity_lines.append(f"… et {len(changes) - len(activity_lines)} autre(s)")
+                break
+            activity_lines.append(line)
 
         # GESTION MULTI-CHAMPS (Liste longue)
         MAX_SEGMENT_LENGTH = 1000; segments = []; current_segment_lines = []; current_length = 0
@@ -261,20 +257,33 @@ class Clan(commands.Cog):
         # --- Construction de l'Embed ---
         embed = discord.Embed(
             title=f"⚔️ {current_status} - {clan_name}",
-            description=f"**Trophées de Guerre :** {clan.get('clanWarTrophies', '—')} 🏆",
+            description=f"**Trophées de Guerre :** {dash(clan.clan_war_trophies if clan else None)} 🏆",
             color=0xDC143C 
         )
         embed.add_field(name="🏆 Classement des Clans (Points)", value="\n".join(ranking_lines), inline=False)
-        if not segments:
+        if race_error:
+            embed.add_field(name="⏳ Joueurs avec Decks Restants", value="⚠️ Participation indisponible (course fluviale inaccessible).", inline=False)
+        elif not segments:
             embed.add_field(name=f"⏳ Joueurs avec Decks Restants (0 membre)", value="✅ Tous les membres actifs ont joué tous leurs decks quotidiens !", inline=False)
         else:
             embed.add_field(name=f"⏳ Joueurs avec Decks Restants (1/{len(segments)} - Total : {total_players_in_list} membres)", value=segments[0], inline=False)
             for i, segment in enumerate(segments[1:], 2):
                 embed.add_field(name=f"⏳ Partie ({i}/{len(segments)})", value=segment, inline=False)
-        embed.set_footer(text=f"Données de l'API Clash Royale pour {current_status}. (Estimation basée sur decksUsed).")
+        if changes is not None:
+            embed.add_field(
+                name="🆕 Ont joué depuis ta dernière consultation",
+                value="\n".join(activity_lines) or "Personne n'a joué depuis ta dernière consultation.",
+                inline=False
+            )
+        footer = f"Données de l'API Clash Royale pour {current_status}. (Estimation basée sur decksUsedToday)."
+        if war.errors:
+            footer += " ⚠️ Résultat partiel : une partie des données n'a pas pu être chargée."
+        if stale:
+            footer += f" {STALE_NOTICE}"
+        embed.set_footer(text=footer)
         
         await interaction.followup.send(embed=embed)
 
 
 async def setup(bot):
-    await bot.add_cog(Clan(bot))
\ No newline at end of file
+    await bot.add_cog(Clan(bot, bot.cr, bot.river_races, bot.player_clans, bot.participation))
\ No newline at end of file
@@ -4,40 +4,20 @@ import discord
 from discord.ext import commands
 from discord import ui
 import os
-import aiohttp
 import io
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-from pathlib import Path
-import colorsys
-import math 
+import asyncio
+import logging
+from typing import Any, Dict, List
 # --- Imports Corrigés ---
 from db import set_user_tag  # Utilise la fonction de la DB (asynchrone)
 from cr_api import CRClient, CRApiError
+from banner import AvatarCache, BannerRenderer, BannerQueueFull, BANNER_FILENAME
 from config import (
     SALON_CONNEXION_NAME, SALON_CONNEXION_ID, SALON_ARRIVEE_NAME, SALON_ARRIVEE_ID,
-    WELCOME_BACKGROUND_PATH, WELCOME_FONT_PATH
+    WELCOME_WORKERS, WELCOME_QUEUE_MAX, WELCOME_BURST_THRESHOLD, WELCOME_BURST_MAX
 )
 
-# --- Constantes pour l'Image (Votre code original) ---
-TEXT_COLOR_FILL = (250, 250, 250, 255) 
-OUTLINE_COLOR_DARK_RED = (139, 0, 0, 255)  
-GLOW_COLOR_SINGLE = (255, 200, 200, 255) 
-AVATAR_SIZE = 180 
-GLOW_ITERATIONS = 2 
-OUTLINE_THICKNESS = 5 
-GLOW_RADIUS_SINGLE = 12 
-
-font_path = Path(WELCOME_FONT_PATH)
-try:
-    if font_path.exists():
-        resolved_font_path = str(font_path.resolve())
-        FONT_NOM = ImageFont.truetype(resolved_font_path, 100) 
-    else:
-        # Fallback pour le développement ou l'hébergement
-        FONT_NOM = ImageFont.load_default(size=60)
-except Exception:
-    FONT_NOM = ImageFont.load_default(size=60)
-# ----------------------------------------------------
+logger = logging.getLogger("dh2.welcome")
 
 
 class ConnexionModal(discord.ui.Modal, title="Connexion Clash Royale"):
@@ -48,6 +28,10 @@ class ConnexionModal(discord.ui.Modal, title="Connexion Clash Royale"):
         max_length=15,
         required=True,
     )
+
+    def __init__(self, cr: CRClient):
+        super().__init__()
+        self.cr = cr # Client API partagé
     
     async def on_submit(self, interaction: discord.Interaction):
         """Vérifie le tag via l'API et sauvegarde dans la DB."""
@@ -57,12 +41,10 @@ class ConnexionModal(discord.ui.Modal, title="Connexion Clash Royale"):
         player_tag = self.tag.value.strip().upper().replace('#', '')
         user_id = interaction.user.id
 
-        # 2. Vérification du tag via l'API (utilisation de 'async with')
+        # 2. Vérification du tag via l'API (client partagé)
         try:
-            async with CRClient() as cr:
-                player_data = await cr.get_player(player_tag)
-                
-            player_name = player_data.get('name', 'Joueur Inconnu')
+            player_data = await self.cr.get_player(player_tag)
+            player_name = player_data.name or 'Joueur Inconnu'
 
             # 3. Sauvegarde asynchrone dans la base de données
             await set_user_tag(user_id, player_tag)
@@ -86,90 +68,65 @@ class ConnexionModal(discord.ui.Modal, title="Connexion Clash Royale"):
 
 
 class ConnexionView(discord.ui.View):
-    def __init__(self):
+    def __init__(self, cr: CRClient):
         super().__init__(timeout=None) 
+        self.cr = cr
 
     @discord.ui.button(label="🔗 Connexion", style=discord.ButtonStyle.primary, custom_id="connect_button")
     async def connect(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = ConnexionModal()
+        modal = ConnexionModal(self.cr)
         await interaction.response.send_modal(modal)
 
 
-# --- Votre fonction generate_welcome_banner (inchangée) ---
-async def generate_welcome_banner(member: discord.Member) -> discord.File | None:
-    background_path = Path(WELCOME_BACKGROUND_PATH)
-    if not background_path.exists():
-        return None
+# --- Bannière de bienvenue : téléchargement asynchrone, rendu dans le pool (banner.py) ---
+async def generate_welcome_banner(
+    member: discord.Member, renderer: BannerRenderer, avatars: AvatarCache
+) -> discord.File | None:
     try:
-        background = Image.open(str(background_path.resolve())).convert("RGBA")
-        draw = ImageDraw.Draw(background)
-        async with aiohttp.ClientSession() as session:
-            async with session.get(member.display_avatar.url) as resp:
-                avatar_data = io.BytesIO(await resp.read())
-        avatar = Image.open(avatar_data).convert("RGBA").resize((AVATAR_SIZE, AVATAR_SIZE))
-        mask = Image.new("L", (AVATAR_SIZE, AVATAR_SIZE), 0)
-        draw_mask = ImageDraw.Draw(mask)
-        draw_mask.ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
-        avatar_x = (background.width // 2) - (AVATAR_SIZE // 2) 
-        avatar_y = 50 
-        background.paste(avatar, (avatar_x, avatar_y), mask)
-        nom_text = member.display_name
-        bbox_nom = draw.textbbox((0, 0), nom_text, font=FONT_NOM)
-        nom_width = bbox_nom[2] - bbox_nom[0]
-        nom_x_base = (background.width - nom_width) // 2
-        nom_y_base = (background.height // 2) + 10 
-        text_y_offset = -bbox_nom[1] 
-        nom_y_final = nom_y_base + text_y_offset
-        GLOW_DIRECTIONS_UNITS = [
-            (1, 0), (-1, 0), (0, 1), (0, -1),
-            (0.707, 0.707), (-0.707, 0.707), (0.707, -0.707), (-0.707, -0.707)
-        ]
-        def draw_centered_glow(draw_context, text, font, x, y, radius, color):
-            for iteration in range(1, GLOW_ITERATIONS + 1):
-                scale = radius * (iteration / GLOW_ITERATIONS)
-                for dx_unit, dy_unit in GLOW_DIRECTIONS_UNITS:
-                    offset_x = dx_unit * scale
-                    offset_y = dy_unit * scale
-                    draw_context.text((x + offset_x, y + offset_y), text, font=font, fill=color)
-        draw_centered_glow(
-            draw, nom_text, FONT_NOM, 
-            nom_x_base, nom_y_final, 
-            GLOW_RADIUS_SINGLE, GLOW_COLOR_SINGLE
-        )
-        offsets = [
-            (OUTLINE_THICKNESS, 0), (-OUTLINE_THICKNESS, 0), (0, OUTLINE_THICKNESS), (0, -OUTLINE_THICKNESS),
-            (OUTLINE_THICKNESS, OUTLINE_THICKNESS), (-OUTLINE_THICKNESS, OUTLINE_THICKNESS),
-            (OUTLINE_THICKNESS, -OUTLINE_THICKNESS), (-OUTLINE_THICKNESS, -OUTLINE_THICKNESS),
-            (OUTLINE_THICKNESS // 2, OUTLINE_THICKNESS), (-OUTLINE_THICKNESS // 2, OUTLINE_THICKNESS),
-            (OUTLINE_THICKNESS, OUTLINE_THICKNESS // 2), (-OUTLINE_THICKNESS, OUTLINE_THICKNESS // 2),
-        ]
-        for dx, dy in offsets:
-            draw.text(
-                (nom_x_base + dx, nom_y_final + dy), 
-                nom_text, 
-                font=FONT_NOM, 
-                fill=OUTLINE_COLOR_DARK_RED 
-            )
-        draw.text(
-            (nom_x_base, nom_y_final), 
-            nom_text, 
-            font=FONT_NOM, 
-            fill=TEXT_COLOR_FILL
-        )
-        buffer_final = io.BytesIO()
-        background.save(buffer_final, format="PNG")
-        buffer_final.seek(0)
-        return discord.File(fp=buffer_final, filename="welcome_banner.png")
+        avatar = await avatars.get(member.display_avatar)
+        data = await renderer.render(avatar, member.display_name)
+        if data is None:
+            return None
+        return discord.File(fp=io.BytesIO(data), filename=BANNER_FILENAME)
+    except BannerQueueFull as e:
+        logger.warning(f"⚠️ Bannière ignorée (file pleine) : {e}")
+        return None
     except Exception as e:
         print(f"Erreur critique lors de la génération de la bannière: {e}")
         return None
 # ----------------------------------------------------
 
 class ConnexionCog(commands.Cog, name="Connexion"):
-    def __init__(self, bot):
+    def __init__(self, bot, cr: CRClient):
         self.bot = bot
+        self.cr = cr # Client API partagé (injecté depuis bot.main)
+        self.banners = BannerRenderer() # Rendu Pillow hors de la boucle asyncio
+        self.avatars = AvatarCache() # Avatars déjà téléchargés et décodés
+        # File des arrivées : nombre de workers borné, regroupement en cas de vague
+        self.welcome_queue: asyncio.Queue = asyncio.Queue(maxsize=max(0, WELCOME_QUEUE_MAX))
+        self._workers: List[asyncio.Task] = []
+        self.welcome_metrics: Dict[str, int] = {
+            "max_depth": 0, "welcomed": 0, "banners": 0, "burst_messages": 0, "dropped": 0,
+        }
         # Enregistre la vue persistante
-        self.bot.add_view(ConnexionView())
+        self.bot.add_view(ConnexionView(self.cr))
+
+    async def cog_load(self):
+        self._workers = [asyncio.create_task(self._welcome_worker()) for _ in range(max(1, WELCOME_WORKERS))]
+
+    async def cog_unload(self):
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self.banners.close()
+        logger.info(f"📊 Bienvenue : {self.welcome_stats()}")
+
+    def welcome_stats(self) -> Dict[str, Any]:
+        """Métriques de la file d'accueil (profondeur actuelle incluse)."""
+        return {
+            "depth": self.welcome_queue.qsize(), **self.welcome_metrics,
+            "avatars": self.avatars.stats(), "renderer": self.banners.stats(),
+        }
 
     # === MESSAGE STATIQUE DANS #connexion ===
     @commands.Cog.listener()
@@ -200,7 +157,7 @@ class ConnexionCog(commands.Cog, name="Connexion"):
         )
         embed.set_thumbnail(url="https://cdn.royaleapi.com/static/img/badge/icon.png")
         embed.set_footer(text="DH² - Connecté au royaume de Clash Royale 🛡️")
-        view = ConnexionView()
+        view = ConnexionView(self.cr)
         await channel.send(embed=embed, view=view)
 
 
@@ -208,10 +165,60 @@ class ConnexionCog(commands.Cog, name="Connexion"):
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         if member.bot: return
+        try:
+            self.welcome_queue.put_nowait(member)
+        except asyncio.QueueFull:
+            self.welcome_metrics["dropped"] += 1
+            return
+        depth = self.welcome_queue.qsize()
+        self.welcome_metrics["max_depth"] = max(self.welcome_metrics["max_depth"], depth)
+
+    async def _welcome_worker(self):
+        while True:
+            member = await self.welcome_queue.get()
+            batch = [member]
+            # Vague d'arrivées : on vide une partie de la file pour un seul message groupé
+            if self.welcome_queue.qsize() + 1 >= WELCOME_BURST_THRESHOLD:
+                while len(batch) < WELCOME_BURST_MAX and not self.welcome_queue.empty():
+                    batch.append(self.welcome_queue.get_nowait())
+            try:
+                by_guild: Dict[int, List[discord.Member]] = {}
+                for m in batch:
+                    by_guild.setdefault(m.guild.id, []).append(m)
+                for members in by_guild.values():
+                    if len(members) == 1:
+                        await self._welcome_one(members[0])
+                    else:
+                        await self._welcome_burst(members)
+                    self.welcome_metrics["welcomed"] += len(members)
+            except Exception as e:
+                logger.error(f"❌ Message de bienvenue échoué : {e}")
+            finally:
+                for _ in batch:
+                    self.welcome_queue.task_done()
+
+    async def _welcome_burst(self, members: List[discord.Member]):
+        guild = members[0].guild
+        channel = discord.utils.get(guild.text_channels, name=SALON_ARRIVEE_NAME)
+        if channel is None: return
+        embed = discord.Embed(
+            title=f"🎉 {len(members)} nouveaux membres dans l'arène !",
+            description=(
+                f"Bienvenue à {', '.join(m.mention for m in members)} sur **{guild.name}** !\n\n"
+                f"N'oubliez pas de vous connecter à votre compte Clash Royale dans le salon <#{SALON_CONNEXION_ID}>."
+            ),
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text="Généré par DH²")
+        await channel.send(embed=embed)
+        self.welcome_metrics["burst_messages"] += 1
+        logger.info(f"🌊 Vague d'arrivées : {len(members)} membres accueillis en un message (file : {self.welcome_queue.qsize()}).")
+
+    async def _welcome_one(self, member: discord.Member):
         channel = discord.utils.get(member.guild.text_channels, name=SALON_ARRIVEE_NAME)
         if channel is None: return 
         
-        file = await generate_welcome_banner(member)
+        file = await generate_welcome_banner(member, self.banners, self.avatars)
 
         if file:
             embed = discord.Embed(
@@ -222,14 +229,15 @@ class ConnexionCog(commands.Cog, name="Connexion"):
                 ),
                 color=discord.Color.gold()
             )
-            embed.set_image(url="attachment://welcome_banner.png")
+            embed.set_image(url=f"attachment://{BANNER_FILENAME}")
             embed.set_footer(text="Généré par DH²")
             
             # Note: Remplacez <URL_VERS_SALON_CONNEXION> par l'ID réel du salon dans votre serveur si possible, ou laissez ainsi.
             await channel.send(embed=embed, file=file)
+            self.welcome_metrics["banners"] += 1
         else:
             await channel.send(f"Bienvenue, {member.mention} sur le serveur **{member.guild.name}** ! 👋")
 
 
 async def setup(bot):
-    await bot.add_cog(ConnexionCog(bot))
\ No newline at end of file
+    await bot.add_cog(ConnexionCog(bot, bot.cr))
\ No newline at end of file
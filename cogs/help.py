@@ -39,7 +39,9 @@ class HelpCog(commands.Cog):
                 "**Infos affichées :** nom, clan, trophées, niveau de roi, victoires 3 couronnes, % victoires\n"
                 "`/profile battles` → Affiche tes 5 dernières batailles\n"
                 "`/profile battles <tag>` → Affiche les 5 dernières batailles d’un joueur spécifique\n"
-                "**Infos affichées :** mode de jeu, résultat, adversaire\n\n"
+                "**Infos affichées :** mode de jeu, résultat, adversaire\n"
+                "`/profile stats [tag]` → Victoires par mode, élixir moyen, cartes favorites, écart de couronnes\n"
+                "`/profile history [tag] [jours]` → Évolution des trophées jour par jour (comptes liés)\n\n"
                 "\n"
             ),
             inline=False
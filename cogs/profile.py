@@ -2,12 +2,17 @@
 from discord.ext import commands
 import discord
 from discord import app_commands
-from cr_api import CRClient, CRApiError
+from cr_api import CRClient, CRApiError, Player, Battle, is_stale, dash, STALE_NOTICE
 # --- Import Corrigé ---
-from db import get_user_tag # Utilise la DB asynchrone
+from db import get_user_tag, get_snapshots, get_battles, DAY # Utilise la DB asynchrone
+from battle_stats import BattleStatsCache
+from card_data import CardDataStore
+import time
 import os
 # json et la fonction get_user_tag_from_json sont supprimés
 
+STATS_MAX_BATTLES = 200 # Combats locaux (comptes liés) pris en compte par /profile stats
+
 # --- FONCTION D'AIDE : Traduction des Types de Combat ---
 def translate_battle_type(api_type: str) -> str:
     """Traduit les types de combat bruts de l'API en français clair."""
@@ -25,21 +30,19 @@ def translate_battle_type(api_type: str) -> str:
     return translations.get(api_type, api_type.title())
 # -------------------------------------------------------------------
 
-# --- FONCTION D'AIDE : Formatage du Profil (inchangée) ---
-def format_profile(p: dict) -> str:
-    # ... (Votre code de formatage de profil) ...
-    name = p.get("name", "—"); tag = p.get("tag", "—")
-    clan = p.get("clan", {}).get("name", "—"); clan_tag = p.get("clan", {}).get("tag", "—")
-    level = p.get("expLevel", "—"); exp = p.get("expPoints", "—")
+# --- FONCTION D'AIDE : Formatage du Profil ---
+def format_profile(p: Player) -> str:
+    tag = dash(p.tag)
+    clan = dash(p.clan_name); clan_tag = dash(p.clan_tag)
+    level = dash(p.exp_level); exp = dash(p.exp_points)
     if level == 70: exp = "Max"
-    trophies = p.get("trophies", "—"); wins = p.get("wins", 0)
-    total_battles = p.get("battleCount", 0); losses = p.get("losses", 0)
-    draws = p.get("draws", 0); best_trophies = p.get("bestTrophies", "—")
+    trophies = dash(p.trophies); wins = p.wins
+    total_battles = p.battle_count; losses = p.losses
+    draws = p.draws
     win_rate = (wins / total_battles * 100) if total_battles > 0 else 0
-    three_crown_wins = p.get("threeCrownWins", 0)
-    league_stats = p.get("leagueStatistics", {}); current_pol = league_stats.get("currentSeason", {})
-    best_pol = league_stats.get("bestSeason", {}); best_pol_score = best_pol.get("trophies", "—")
-    best_pol_rank = best_pol.get("rank")
+    three_crown_wins = p.three_crown_wins
+    best_pol_score = dash(p.best_pol_trophies)
+    best_pol_rank = p.best_pol_rank
     rank_display = f" (Rang #{best_pol_rank:,})" if best_pol_rank and best_pol_rank > 0 else ""
     text = (
         f"**🔖 Tag :** `{tag}`\n"
@@ -57,8 +60,11 @@ def format_profile(p: dict) -> str:
 
 
 class Profile(commands.Cog):
-    def __init__(self, bot):
+    def __init__(self, bot, cr: CRClient, cards: CardDataStore):
         self.bot = bot
+        self.cr = cr       # Client API partagé (injecté depuis bot.main)
+        self.cards = cards # Index de cartes_data.json (coûts en élixir), injecté depuis bot.main
+        self.battle_stats = BattleStatsCache() # Statistiques par joueur, jusqu'au prochain combat
 
     # --- DÉCLARATION DU GROUPE DE COMMANDES /profile ---
     profile_group = app_commands.Group(name="profile", description="Commandes liées au profil Clash Royale.")
@@ -86,25 +92,25 @@ class Profile(commands.Cog):
             target_tag = user_tag.replace("#", "").upper()
 
         try:
-            # 3. MIGRATION API (Utilisation de 'async with')
-            async with CRClient() as cr:
-                player = await cr.get_player(target_tag)
-                
+            # 3. API (client partagé, connexions réutilisées)
+            player = await self.cr.get_player(target_tag)
         except CRApiError as e:
             await interaction.followup.send(f"❌ Erreur Clash Royale : {e}", ephemeral=True)
             return
 
         embed = discord.Embed(
-            title=f"Profil de {player.get('name', '—')} (`#{target_tag}`)",
+            title=f"Profil de {dash(player.name)} (`#{target_tag}`)",
             color=0x00A2E8
         )
         embed.description = format_profile(player)
         
-        badge_url = player.get("badgeUrls", {}).get("large")
-        if badge_url:
-            embed.set_thumbnail(url=badge_url)
+        if player.badge_url:
+            embed.set_thumbnail(url=player.badge_url)
             
-        embed.set_footer(text="Utilise /profile battles pour plus d'infos.")
+        footer = "Utilise /profile battles pour plus d'infos."
+        if is_stale(player):
+            footer += f" {STALE_NOTICE}"
+        embed.set_footer(text=footer)
 
         # Envoi en non-éphémère pour permettre le partage
         await interaction.followup.send(embed=embed, ephemeral=False)
@@ -131,10 +137,8 @@ class Profile(commands.Cog):
         target_tag = target_tag.replace("#", "").upper()
 
         try:
-            # 3. MIGRATION API
-            async with CRClient() as cr:
-                battle_log = await cr.get_battle_log(target_tag)
-                
+            # 3. API (client partagé)
+            battle_log = await self.cr.get_battle_log(target_tag)
         except CRApiError as e:
             await interaction.followup.send(f"❌ Erreur Clash Royale : {e}", ephemeral=True)
             return
@@ -145,11 +149,10 @@ class Profile(commands.Cog):
 
         battle_summaries = []
         for battle in battle_log[:5]:
-            if not battle.get("team") or not battle.get("opponent"): continue
+            if battle.team_crowns is None: continue # Combat sans équipe/adversaire
             
-            api_type = battle.get("type", "unknown"); battle_type_display = translate_battle_type(api_type) 
-            team_member = battle["team"][0]; opponent_member = battle["opponent"][0]
-            team_crowns = team_member.get("crowns", 0); opponent_crowns = opponent_member.get("crowns", 0)
+            battle_type_display = translate_battle_type(battle.type) 
+            team_crowns = battle.team_crowns; opponent_crowns = battle.opponent_crowns
             
             result_icon = "❓"
             if team_crowns > opponent_crowns: result_icon = "✅ Victoire"
@@ -160,7 +163,7 @@ class Profile(commands.Cog):
             summary = (
                 f"**{result_icon}** ({team_crowns}-{opponent_crowns} 👑) | "
                 f"Type : *{battle_type_display}* | " 
-                f"Adversaire : **{opponent_member.get('name', 'Anonyme')}**"
+                f"Adversaire : **{battle.opponent_name or 'Anonyme'}**"
             )
             battle_summaries.append(summary)
 
@@ -169,10 +172,141 @@ class Profile(commands.Cog):
             description="\n\n".join(battle_summaries),
             color=0x8A2BE2
         )
-        embed.set_footer(text=f"Données officielles Clash Royale © Supercell pour #{target_tag}")
+        footer = f"Données officielles Clash Royale © Supercell pour #{target_tag}"
+        if is_stale(battle_log):
+            footer += f" {STALE_NOTICE}"
+        embed.set_footer(text=footer)
         
         await interaction.followup.send(embed=embed, ephemeral=False)
 
+    # --- SOUS-COMMANDE : /profile stats ---
+    @profile_group.command(name="stats", description="Statistiques des derniers combats : victoires par mode, élixir moyen, cartes favorites.")
+    @app_commands.describe(tag="Tag du joueur (optionnel).")
+    async def profile_stats(self, interaction: discord.Interaction, tag: str = None):
+        await interaction.response.defer(ephemeral=True)
+
+        if tag:
+            target_tag = tag.strip().replace("#", "").upper()
+        else:
+            user_tag = await get_user_tag(interaction.user.id)
+            if not user_tag:
+                await interaction.followup.send("⚠️ Tu dois lier ton compte ou fournir un tag pour voir tes statistiques.", ephemeral=True)
+                return
+            target_tag = user_tag.replace("#", "").upper()
+
+        try:
+            battle_log = await self.cr.get_battle_log(target_tag)
+        except CRApiError as e:
+            await interaction.followup.send(f"❌ Erreur Clash Royale : {e}", ephemeral=True)
+            return
+
+        # Comptes liés : journal complet enregistré localement (battle_ingest), complété par l'API
+        stale = is_stale(battle_log) # Avant la fusion : le marqueur ne survit pas à la concaténation
+        local = await get_battles(target_tag, STATS_MAX_BATTLES)
+        source, kind = "le journal de combats de l'API (25 derniers combats max)", "api"
+        if len(local) > len(battle_log):
+            known = {row[0] for row in local}
+            battle_log = tuple(b for b in battle_log if b.battle_time not in known) + tuple(
+                Battle._new(type=t, battle_time=bt, team_crowns=tc, opponent_crowns=oc, opponent_name=on, team_deck=tuple(deck))
+                for bt, t, tc, oc, on, deck in local
+            )
+            source, kind = "l'historique local des combats", "local"
+
+        # Coûts en élixir : index de cartes_data.json (noms EN de l'API), lu une fois pour toute la commande
+        index = self.cards.index
+        def elixir_of(name: str):
+            card = index.get(name)
+            return card["cout_elixir"] if card and isinstance(card.get("cout_elixir"), (int, float)) else None
+
+        stats = self.battle_stats.get(target_tag, battle_log, elixir_of, version=index.generation, source=kind)
+        if not stats["battles"]:
+            await interaction.followup.send("ℹ️ Aucun combat récent trouvé pour ce joueur.", ephemeral=True)
+            return
+
+        n = stats["battles"]
+        embed = discord.Embed(
+            title=f"📊 Statistiques des {n} derniers combats — #{target_tag}",
+            description=(
+                f"**Bilan :** {stats['wins']} ✅ / {stats['losses']} ❌ / {stats['draws']} 🤝 "
+                f"({stats['wins'] * 100 / n:.0f}% de victoires)"
+            ),
+            color=0x8A2BE2
+        )
+        type_lines = [
+            f"*{translate_battle_type(battle_type)}* : {won * 100 / count:.0f}% ({won}/{count})"
+            for battle_type, (count, won, _) in sorted(stats["by_type"].items(), key=lambda item: -item[1][0])
+        ]
+        embed.add_field(name="🎮 Victoires par mode", value="\n".join(type_lines), inline=False)
+        avg_elixir = stats["avg_elixir"]
+        embed.add_field(name="💧 Élixir moyen", value=f"{avg_elixir:.1f}" if avg_elixir is not None else "—", inline=True)
+        embed.add_field(
+            name="👑 Couronnes",
+            value=f"{stats['crowns_for']} pour / {stats['crowns_against']} contre ({stats['avg_crown_diff']:+.2f} par combat)",
+            inline=True
+        )
+        embed.add_field(
+            name="🃏 Cartes les plus jouées",
+            value="\n".join(f"{name} — {count} combat(s)" for name, count in stats["top_cards"]) or "—",
+            inline=False
+        )
+        footer = f"Calculé sur {source}."
+        if stale:
+            footer += f" {STALE_NOTICE}"
+        embed.set_footer(text=footer)
+
+        await interaction.followup.send(embed=embed, ephemeral=False)
+
+    # --- SOUS-COMMANDE : /profile history ---
+    @profile_group.command(name="history", description="Affiche l'évolution des trophées du joueur (historique local).")
+    @app_commands.describe(tag="Tag du joueur (optionnel).", jours="Nombre de jours à afficher (7 par défaut).")
+    async def profile_history(self, interaction: discord.Interaction, tag: str = None, jours: app_commands.Range[int, 1, 90] = 7):
+        await interaction.response.defer(ephemeral=True)
+
+        if tag:
+            target_tag = tag.strip().replace("#", "").upper()
+        else:
+            user_tag = await get_user_tag(interaction.user.id)
+            if not user_tag:
+                await interaction.followup.send("⚠️ Tu dois lier ton compte ou fournir un tag pour voir l'historique.", ephemeral=True)
+                return
+            target_tag = user_tag.replace("#", "").upper()
+
+        # Aucun appel API : lecture des instantanés enregistrés par history.SnapshotRecorder
+        now = int(time.time())
+        points = await get_snapshots("player", target_tag, now - jours * DAY, now)
+        if not points:
+            await interaction.followup.send(
+                "ℹ️ Aucun historique pour ce joueur (seuls les comptes liés sont suivis).", ephemeral=True
+            )
+            return
+
+        daily = {}
+        for taken_at, state in points:
+            daily[max(taken_at, now - jours * DAY) // DAY] = state # Dernier point de chaque jour
+        lines = []
+        previous = None
+        for day in sorted(daily):
+            trophies = daily[day].get("trophies")
+            diff = ""
+            if previous is not None and trophies is not None:
+                diff = f" ({trophies - previous:+d})"
+            lines.append(f"`{time.strftime('%d/%m', time.gmtime(day * DAY))}` 🏆 {dash(trophies)}{diff}")
+            previous = trophies
+
+        first, last = points[0][1], points[-1][1]
+        embed = discord.Embed(
+            title=f"📈 Évolution sur {jours} jour(s) — #{target_tag}",
+            description="\n".join(lines[-25:]),
+            color=0x8A2BE2
+        )
+        if first.get("wins") is not None and last.get("wins") is not None:
+            embed.add_field(name="Victoires", value=f"+{last['wins'] - first['wins']}", inline=True)
+        if first.get("battle_count") is not None and last.get("battle_count") is not None:
+            embed.add_field(name="Combats", value=f"+{last['battle_count'] - first['battle_count']}", inline=True)
+        embed.set_footer(text="Historique local (instantanés périodiques des comptes liés)")
+
+        await interaction.followup.send(embed=embed, ephemeral=False)
+
 
 async def setup(bot):
-    await bot.add_cog(Profile(bot))
\ No newline at end of file
+    await bot.add_cog(Profile(bot, bot.cr, bot.cards))
\ No newline at end of file
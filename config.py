@@ -8,6 +8,22 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 CLASH_ROYALE_TOKEN = os.getenv("CLASH_ROYALE_TOKEN")
 DB_PATH = os.getenv("DB_PATH", "./dh2.db")
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "0"))  # Liens discord_id -> tag gardés en mémoire (0 = tous)
+PLAYER_CLAN_TTL = float(os.getenv("PLAYER_CLAN_TTL", "1800"))     # Durée de vie du lien joueur -> clan en mémoire
+PLAYER_CLAN_MAXSIZE = int(os.getenv("PLAYER_CLAN_MAXSIZE", "5000"))  # Liens joueur -> clan gardés au plus
+
+# --- Historique (instantanés joueurs/clans) ---
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "3600"))                 # Un instantané par heure
+SNAPSHOT_DOWNSAMPLE_AFTER = float(os.getenv("SNAPSHOT_DOWNSAMPLE_AFTER", "604800"))  # Au-delà (7 j) : un point par jour
+SNAPSHOT_KEYFRAME_EVERY = int(os.getenv("SNAPSHOT_KEYFRAME_EVERY", "24"))         # Instantané complet tous les N deltas
+SNAPSHOT_CONCURRENCY = int(os.getenv("SNAPSHOT_CONCURRENCY", "4"))                # Appels API simultanés du collecteur
+
+# --- Ingestion des journaux de combats (comptes liés) ---
+BATTLE_INGEST_TICK = float(os.getenv("BATTLE_INGEST_TICK", "60"))                  # Réveil de l'ordonnanceur
+BATTLE_INGEST_MIN_INTERVAL = float(os.getenv("BATTLE_INGEST_MIN_INTERVAL", "900"))    # Joueur très actif
+BATTLE_INGEST_MAX_INTERVAL = float(os.getenv("BATTLE_INGEST_MAX_INTERVAL", "21600"))  # Joueur inactif (6 h)
+BATTLE_INGEST_CONCURRENCY = int(os.getenv("BATTLE_INGEST_CONCURRENCY", "4"))       # Journaux demandés simultanément
+
 # Optionnel : IDs de guilds pour synchroniser les slash commands pendant le dev
 GUILD_IDS = [int(x) for x in os.getenv("GUILD_IDS", "").split(",") if x.strip()]
 
@@ -18,6 +34,69 @@ SALON_ARRIVEE_ID = os.getenv("SALON_ARRIVEE_ID")  # ID du salon d'arrivée (opti
 
 WELCOME_BACKGROUND_PATH = "data/welcome_banner.png"
 WELCOME_FONT_PATH = "data/welcom_font.ttf"
+WELCOME_RENDER_EXECUTOR = os.getenv("WELCOME_RENDER_EXECUTOR", "thread")   # "thread" ou "process" (rendu Pillow hors boucle)
+WELCOME_RENDER_WORKERS = int(os.getenv("WELCOME_RENDER_WORKERS", "2"))     # Bannières rendues en parallèle
+WELCOME_RENDER_QUEUE = int(os.getenv("WELCOME_RENDER_QUEUE", "8"))         # Bannières en attente max (au-delà : message texte)
+WELCOME_BANNER_FORMAT = os.getenv("WELCOME_BANNER_FORMAT", "WEBP").upper() # "WEBP" (~0,1 Mo) ou "PNG" (~1,3 Mo)
+WELCOME_PNG_COMPRESS_LEVEL = int(os.getenv("WELCOME_PNG_COMPRESS_LEVEL", "6"))  # 0-9 : 6 = défaut de Pillow, 1 = rapide mais plus lourd
+WELCOME_WEBP_QUALITY = int(os.getenv("WELCOME_WEBP_QUALITY", "85"))
+WELCOME_WEBP_METHOD = int(os.getenv("WELCOME_WEBP_METHOD", "2"))           # 0-6 : compromis vitesse/taille
+WELCOME_AVATAR_CACHE_SIZE = int(os.getenv("WELCOME_AVATAR_CACHE_SIZE", "256"))  # Avatars décodés gardés en mémoire (LRU)
+WELCOME_WORKERS = int(os.getenv("WELCOME_WORKERS", "2"))                   # Messages de bienvenue traités en parallèle
+WELCOME_QUEUE_MAX = int(os.getenv("WELCOME_QUEUE_MAX", "500"))             # Arrivées en attente max (au-delà : ignorées)
+WELCOME_BURST_THRESHOLD = int(os.getenv("WELCOME_BURST_THRESHOLD", "5"))   # File >= N : un seul message groupé
+WELCOME_BURST_MAX = int(os.getenv("WELCOME_BURST_MAX", "25"))              # Membres max par message groupé
+
+# --- Client HTTP partagé vers l'API Clash Royale ---
+CR_HTTP_LIMIT = int(os.getenv("CR_HTTP_LIMIT", "20"))                    # Connexions simultanées max (toutes cibles)
+CR_HTTP_LIMIT_PER_HOST = int(os.getenv("CR_HTTP_LIMIT_PER_HOST", "10"))  # Connexions max vers api.clashroyale.com
+CR_DNS_TTL = int(os.getenv("CR_DNS_TTL", "300"))                         # Durée du cache DNS (secondes)
+CR_KEEPALIVE_TIMEOUT = float(os.getenv("CR_KEEPALIVE_TIMEOUT", "60"))    # Durée de vie d'une connexion inactive
+CR_HTTP_TIMEOUT = float(os.getenv("CR_HTTP_TIMEOUT", "10"))              # Timeout total d'une tentative
+CR_HTTP_CONNECT_TIMEOUT = float(os.getenv("CR_HTTP_CONNECT_TIMEOUT", "3"))  # Timeout d'établissement de connexion
+
+# --- Résilience : nouvelles tentatives, disjoncteur, données périmées ---
+CR_RETRY_ATTEMPTS = int(os.getenv("CR_RETRY_ATTEMPTS", "3"))             # Tentatives max par GET (5xx, timeout, réseau)
+CR_RETRY_BASE_DELAY = float(os.getenv("CR_RETRY_BASE_DELAY", "0.5"))     # Base du backoff exponentiel (secondes)
+CR_RETRY_MAX_DELAY = float(os.getenv("CR_RETRY_MAX_DELAY", "4"))         # Plafond d'attente entre deux tentatives
+CR_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CR_CIRCUIT_FAILURE_THRESHOLD", "5"))  # Échecs consécutifs avant ouverture
+CR_CIRCUIT_RESET_TIMEOUT = float(os.getenv("CR_CIRCUIT_RESET_TIMEOUT", "30"))       # Durée d'ouverture avant test
+CR_STALE_MAX_AGE = float(os.getenv("CR_STALE_MAX_AGE", "21600"))         # Âge max d'une réponse servie en secours (6 h)
+
+# --- Cache persistant des réponses (SQLite, à côté de DB_PATH) ---
+CR_PERSISTENT_CACHE = os.getenv("CR_PERSISTENT_CACHE", "1") == "1"       # "0" pour désactiver
+CR_CACHE_DB_PATH = os.getenv("CR_CACHE_DB_PATH", os.path.join(os.path.dirname(DB_PATH) or ".", "cr_cache.db"))
+CR_CACHE_FLUSH_INTERVAL = float(os.getenv("CR_CACHE_FLUSH_INTERVAL", "5"))  # Écriture groupée sur disque (secondes)
+
+# --- Cache des réponses de l'API (TTL en secondes, 0 = pas de cache) ---
+CR_CACHE_MAXSIZE = int(os.getenv("CR_CACHE_MAXSIZE", "512"))             # Nombre max d'entrées (LRU)
+CR_CACHE_TTL_PLAYER = float(os.getenv("CR_CACHE_TTL_PLAYER", "60"))      # /players/{tag} (+ upcomingchests)
+CR_CACHE_TTL_CLAN = float(os.getenv("CR_CACHE_TTL_CLAN", "120"))         # /clans/{tag} (+ warlog)
+CR_CACHE_TTL_RIVER_RACE = float(os.getenv("CR_CACHE_TTL_RIVER_RACE", "30"))  # /clans/{tag}/currentriverrace
+CR_CACHE_TTL_BATTLELOG = float(os.getenv("CR_CACHE_TTL_BATTLELOG", "60"))    # /players/{tag}/battlelog
+CR_CACHE_TTL_CARDS = float(os.getenv("CR_CACHE_TTL_CARDS", "86400"))     # /cards (change rarement)
+
+# --- Limitation de débit côté client (seau à jetons) ---
+CR_RATE_LIMIT_PER_SEC = float(os.getenv("CR_RATE_LIMIT_PER_SEC", "10"))  # Jetons régénérés par seconde (0 = désactivé)
+CR_RATE_LIMIT_BURST = float(os.getenv("CR_RATE_LIMIT_BURST", "20"))      # Taille du seau (rafale max)
+CR_RATE_LIMIT_MAX_RETRIES = int(os.getenv("CR_RATE_LIMIT_MAX_RETRIES", "5"))  # Remises en file après un 429
+CR_RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("CR_RATE_LIMIT_DEFAULT_BACKOFF", "1"))  # Pause si 429 sans Retry-After
+
+# --- Catalogue local des cartes (/cards) ---
+CARD_CATALOG_PATH = os.getenv("CARD_CATALOG_PATH", "data/cards_catalog.json")  # Copie disque pour démarrage hors-ligne
+CARD_CATALOG_REFRESH_INTERVAL = float(os.getenv("CARD_CATALOG_REFRESH_INTERVAL", "43200"))  # 12 h
+CARDS_DATA_POLL_INTERVAL = float(os.getenv("CARDS_DATA_POLL_INTERVAL", "5"))  # Vérification de cartes_data.json (0 = jamais)
+
+# --- Préchargement des courses fluviales (clans des comptes liés) ---
+RIVER_RESET_UTC = os.getenv("RIVER_RESET_UTC", "09:40")                          # Heure UTC du reset quotidien de la guerre
+RIVER_PREFETCH_INTERVAL = float(os.getenv("RIVER_PREFETCH_INTERVAL", "600"))     # Rafraîchissement hors période chaude
+RIVER_PREFETCH_FAST_INTERVAL = float(os.getenv("RIVER_PREFETCH_FAST_INTERVAL", "120"))  # Rafraîchissement près du reset
+RIVER_PREFETCH_FAST_WINDOW = float(os.getenv("RIVER_PREFETCH_FAST_WINDOW", "7200"))     # Période chaude : 2 h avant le reset
+RIVER_PREFETCH_CONCURRENCY = int(os.getenv("RIVER_PREFETCH_CONCURRENCY", "3"))   # Clans rafraîchis simultanément
+RIVER_PREFETCH_MAX_AGE = float(os.getenv("RIVER_PREFETCH_MAX_AGE", "900"))       # Âge max d'un instantané servi tel quel
+RIVER_PREFETCH_CLANS_REFRESH = float(os.getenv("RIVER_PREFETCH_CLANS_REFRESH", "3600"))  # Redécouverte des clans liés
+RIVER_CALL_TIMEOUT = float(os.getenv("RIVER_CALL_TIMEOUT", "8"))                 # Timeout par appel (file d'attente + tentatives)
+PARTICIPATION_RETENTION = float(os.getenv("PARTICIPATION_RETENTION", "604800"))  # Oubli d'un membre absent des courses (7 jours)
 
 if not DISCORD_TOKEN:
     raise RuntimeError("DISCORD_TOKEN manquant dans .env")
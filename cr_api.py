@@ -1,83 +1,939 @@
 # cr_api.py -- minimal wrapper async pour api.clashroyale.com/v1
+import asyncio
+import copy
+import heapq
+import itertools
+import json
+import logging
+import random
+import re
+import time
 import aiohttp
-from typing import Optional, Dict, Any, List
-from config import CLASH_ROYALE_TOKEN
+import aiosqlite
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from config import (
+    CLASH_ROYALE_TOKEN, CR_HTTP_LIMIT, CR_HTTP_LIMIT_PER_HOST,
+    CR_DNS_TTL, CR_KEEPALIVE_TIMEOUT, CR_HTTP_TIMEOUT, CR_HTTP_CONNECT_TIMEOUT,
+    CR_CACHE_MAXSIZE, CR_CACHE_TTL_PLAYER, CR_CACHE_TTL_CLAN,
+    CR_CACHE_TTL_RIVER_RACE, CR_CACHE_TTL_BATTLELOG, CR_CACHE_TTL_CARDS,
+    CR_RATE_LIMIT_PER_SEC, CR_RATE_LIMIT_BURST, CR_RATE_LIMIT_MAX_RETRIES,
+    CR_RATE_LIMIT_DEFAULT_BACKOFF, CR_RETRY_ATTEMPTS, CR_RETRY_BASE_DELAY,
+    CR_RETRY_MAX_DELAY, CR_CIRCUIT_FAILURE_THRESHOLD, CR_CIRCUIT_RESET_TIMEOUT,
+    CR_STALE_MAX_AGE, CR_CACHE_DB_PATH, CR_CACHE_FLUSH_INTERVAL
+)
 
 BASE = "https://api.clashroyale.com/v1"
 
+logger = logging.getLogger("dh2.cr_api")
+
+# TTL par endpoint : le premier motif qui correspond au chemin l'emporte
+ENDPOINT_TTLS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"^/players/[^/]+/battlelog$"), CR_CACHE_TTL_BATTLELOG),
+    (re.compile(r"^/players/[^/]+(/upcomingchests)?$"), CR_CACHE_TTL_PLAYER),
+    (re.compile(r"^/clans/[^/]+/currentriverrace$"), CR_CACHE_TTL_RIVER_RACE),
+    (re.compile(r"^/clans/[^/]+(/warlog)?$"), CR_CACHE_TTL_CLAN),
+    (re.compile(r"^/cards$"), CR_CACHE_TTL_CARDS),
+]
+
+# Files de priorité du limiteur (plus petit = plus prioritaire)
+PRIORITY_INTERACTIVE = 0 # Commandes slash (un utilisateur attend la réponse)
+PRIORITY_BACKGROUND = 1  # Tâches périodiques (préchargement, ingestion...)
+
+_MISSING = object()
+_NOT_MODIFIED = object() # Réponse 304 à une requête conditionnelle (If-None-Match)
+
 class CRApiError(Exception):
     pass
 
+class CRUnavailableError(CRApiError):
+    """Erreur transitoire (5xx, timeout, réseau, disjoncteur ouvert) : une réponse périmée peut être servie."""
+    pass
+
+class CRRateLimitError(CRUnavailableError):
+    """L'API a répondu 429 trop de fois de suite pour la même requête."""
+    pass
+
+
+# --- Modèles typés (seuls les champs utilisés par les cogs sont conservés) ---
+
+class _Model:
+    """Base des modèles compacts à __slots__.
+
+    from_dict() lit la réponse JSON brute de l'API une seule fois et ne garde que
+    les champs utiles ; to_dict()/from_compact() servent au cache persistant.
+    """
+    __slots__ = ()
+    _nested: Dict[str, type] = {}     # Champ -> modèle des éléments (tuple de sous-modèles)
+    _transient: Tuple[str, ...] = ()  # Champs non persistés
+
+    @classmethod
+    def _new(cls, **fields):
+        obj = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(obj, name, fields.get(name))
+        for name in cls._transient:
+            setattr(obj, name, False)
+        return obj
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {}
+        for name in self.__slots__:
+            if name in self._transient:
+                continue
+            value = getattr(self, name)
+            if name in self._nested:
+                value = [item.to_dict() for item in value]
+            out[name] = value
+        return out
+
+    @classmethod
+    def from_compact(cls, data: Dict[str, Any]):
+        fields = dict(data)
+        for name, model in cls._nested.items():
+            fields[name] = tuple(model.from_compact(item) for item in data.get(name) or ())
+        return cls._new(**fields)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {getattr(self, 'tag', '')} {getattr(self, 'name', '')}>"
+
+
+class Player(_Model):
+    __slots__ = (
+        "tag", "name", "exp_level", "exp_points", "trophies", "best_trophies",
+        "wins", "losses", "draws", "battle_count", "three_crown_wins", "donations",
+        "clan_tag", "clan_name", "badge_url", "best_pol_trophies", "best_pol_rank", "stale",
+    )
+    _transient = ("stale",)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Player":
+        clan = d.get("clan") or {}
+        best_pol = (d.get("leagueStatistics") or {}).get("bestSeason") or {}
+        return cls._new(
+            tag=d.get("tag"), name=d.get("name"),
+            exp_level=d.get("expLevel"), exp_points=d.get("expPoints"),
+            trophies=d.get("trophies"), best_trophies=d.get("bestTrophies"),
+            wins=d.get("wins", 0), losses=d.get("losses", 0), draws=d.get("draws", 0),
+            battle_count=d.get("battleCount", 0), three_crown_wins=d.get("threeCrownWins", 0),
+            donations=d.get("donations", 0),
+            clan_tag=clan.get("tag"), clan_name=clan.get("name"),
+            badge_url=(d.get("badgeUrls") or {}).get("large"),
+            best_pol_trophies=best_pol.get("trophies"), best_pol_rank=best_pol.get("rank"),
+        )
+
+
+class ClanMember(_Model):
+    __slots__ = ("tag", "name", "role", "trophies", "donations", "donations_received")
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ClanMember":
+        return cls._new(
+            tag=d.get("tag"), name=d.get("name"), role=d.get("role"),
+            trophies=d.get("trophies", 0), donations=d.get("donations", 0),
+            donations_received=d.get("donationsReceived", 0),
+        )
+
+
+class Clan(_Model):
+    __slots__ = (
+        "tag", "name", "description", "required_trophies", "members_count",
+        "clan_score", "clan_war_trophies", "location_name", "badge_url", "members", "stale",
+    )
+    _nested = {"members": ClanMember}
+    _transient = ("stale",)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Clan":
+        return cls._new(
+            tag=d.get("tag"), name=d.get("name"), description=d.get("description"),
+            required_trophies=d.get("requiredTrophies"), members_count=d.get("members", 0),
+            clan_score=d.get("clanScore"), clan_war_trophies=d.get("clanWarTrophies"),
+            location_name=(d.get("location") or {}).get("name"),
+            badge_url=(d.get("badgeUrls") or {}).get("large"),
+            members=tuple(ClanMember.from_dict(m) for m in d.get("memberList", [])),
+        )
+
+
+class Battle(_Model):
+    __slots__ = ("type", "battle_time", "team_crowns", "opponent_crowns", "opponent_name", "team_deck")
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Battle":
+        team = (d.get("team") or [None])[0]
+        opponent = (d.get("opponent") or [None])[0]
+        return cls._new(
+            type=d.get("type", "unknown"), battle_time=d.get("battleTime"),
+            # None si l'une des équipes est absente (combat incomplet)
+            team_crowns=team.get("crowns", 0) if team and opponent else None,
+            opponent_crowns=opponent.get("crowns", 0) if team and opponent else None,
+            opponent_name=opponent.get("name") if opponent else None,
+            team_deck=tuple(c.get("name") for c in team.get("cards", [])) if team else (),
+        )
+
+    @classmethod
+    def from_compact(cls, data: Dict[str, Any]) -> "Battle":
+        obj = super().from_compact(data)
+        obj.team_deck = tuple(obj.team_deck or ())
+        return obj
+
+
+class Participant(_Model):
+    __slots__ = ("tag", "name", "fame", "decks_used", "decks_used_today")
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Participant":
+        return cls._new(
+            tag=d.get("tag"), name=d.get("name"), fame=d.get("fame", 0),
+            decks_used=d.get("decksUsed"), decks_used_today=d.get("decksUsedToday"),
+        )
+
+
+class RiverRaceClan(_Model):
+    __slots__ = ("tag", "name", "fame", "participants")
+    _nested = {"participants": Participant}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RiverRaceClan":
+        clan = d.get("clan", d) # Le log des guerres imbrique le clan dans chaque classement
+        return cls._new(
+            tag=clan.get("tag", ""), name=clan.get("name"), fame=clan.get("fame", 0),
+            participants=tuple(Participant.from_dict(p) for p in clan.get("participants", [])),
+        )
+
+
+class RiverRace(_Model):
+    """Course fluviale actuelle (/currentriverrace) ou entrée du log des guerres (/warlog)."""
+    __slots__ = ("state", "period_type", "clans", "participants", "stale")
+    _nested = {"clans": RiverRaceClan, "participants": Participant}
+    _transient = ("stale",)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RiverRace":
+        return cls._new(
+            state=d.get("state"), period_type=d.get("periodType"),
+            clans=tuple(RiverRaceClan.from_dict(c) for c in d.get("clans", d.get("standings", []))),
+            participants=tuple(Participant.from_dict(p) for p in d.get("participants", [])),
+        )
+
+    def participants_for(self, clan_tag: str) -> Tuple[Participant, ...]:
+        """Participants du clan donné (ou liste globale de l'entrée du log)."""
+        clan_tag = clan_tag.strip("#").upper()
+        for clan in self.clans:
+            if clan.tag.strip("#").upper() == clan_tag:
+                return clan.participants or self.participants
+        return self.participants
+
+
+class _Schema:
+    """Conversion réponse brute <-> modèle(s) pour un endpoint donné."""
+
+    def __init__(self, model: type, many: bool = False, items_key: Optional[str] = None):
+        self.model = model
+        self.many = many
+        self.items_key = items_key
+
+    def parse(self, raw: Any) -> Any:
+        if self.many:
+            rows = raw.get(self.items_key, []) if self.items_key else raw
+            return tuple(self.model.from_dict(r) for r in rows)
+        return self.model.from_dict(raw)
+
+    def dump(self, data: Any) -> Any:
+        if self.many:
+            return [m.to_dict() for m in data]
+        return data.to_dict()
+
+    def load(self, compact: Any) -> Any:
+        if self.many:
+            return tuple(self.model.from_compact(m) for m in compact)
+        return self.model.from_compact(compact)
+
+
+# Modèle associé à chaque endpoint (les autres restent en JSON brut)
+ENDPOINT_SCHEMAS: List[Tuple[re.Pattern, _Schema]] = [
+    (re.compile(r"^/players/[^/]+/battlelog$"), _Schema(Battle, many=True)),
+    (re.compile(r"^/players/[^/]+$"), _Schema(Player)),
+    (re.compile(r"^/clans/[^/]+/currentriverrace$"), _Schema(RiverRace)),
+    (re.compile(r"^/clans/[^/]+/warlog$"), _Schema(RiverRace, many=True, items_key="items")),
+    (re.compile(r"^/clans/[^/]+$"), _Schema(Clan)),
+]
+
+
+def dash(value: Any) -> Any:
+    """Affiche '—' pour un champ absent de la réponse de l'API (None dans les modèles)."""
+    return "—" if value is None else value
+
+
+# Mention ajoutée aux embeds construits à partir d'une réponse de secours
+STALE_NOTICE = "⚠️ API Clash Royale indisponible : données en cache."
+
+class StaleTuple(tuple):
+    """Liste de modèles (journal de combats, log des guerres) servie comme copie de secours."""
+    __slots__ = ()
+    stale = True
+
+def is_stale(payload: Any) -> bool:
+    """Vrai si la réponse est une copie de secours servie pendant une panne de l'API."""
+    if isinstance(payload, dict):
+        return payload.get("_stale", False)
+    return getattr(payload, "stale", False)
+
+def _mark_stale(payload: Any, fetched_at: float) -> Any:
+    # Copie superficielle : la valeur de référence reste intacte
+    if isinstance(payload, _Model) and "stale" in payload._transient:
+        payload = copy.copy(payload)
+        payload.stale = True
+    elif isinstance(payload, dict):
+        payload = dict(payload)
+        payload["_stale"] = True
+        payload["_fetched_at"] = fetched_at
+    elif isinstance(payload, tuple):
+        payload = StaleTuple(payload) # Un tuple ne peut pas porter d'attribut : sous-classe marquée
+    return payload
+
+
+class CircuitBreaker:
+    """Disjoncteur : après N échecs consécutifs, coupe les appels pendant reset_timeout.
+
+    Passé ce délai, une seule requête de test est autorisée (semi-ouvert) :
+    un succès referme le circuit, un échec le rouvre.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CR_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CR_CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        """Libère la requête de test sans changer l'état (issue ni succès ni échec)."""
+        self._probing = False
+
+
+class RequestTicket:
+    """Priorité d'une requête partagée, relevée si un appelant plus prioritaire la rejoint.
+
+    `waiting` est le futur de la requête dans la file du limiteur pendant qu'elle attend un jeton.
+    """
+    __slots__ = ("priority", "waiting")
+
+    def __init__(self, priority: int = PRIORITY_INTERACTIVE):
+        self.priority = priority
+        self.waiting: Optional[asyncio.Future] = None
+
+
+class RateLimiter:
+    """Seau à jetons (token bucket) avec files de priorité.
+
+    Les requêtes interactives sont servies avant les tâches de fond ; un 429
+    met toutes les files en pause le temps indiqué par l'en-tête Retry-After.
+    Une requête de fond rejointe par une commande est promue (voir promote).
+    """
+
+    def __init__(
+        self,
+        rate: float = CR_RATE_LIMIT_PER_SEC,
+        burst: float = CR_RATE_LIMIT_BURST,
+        max_retries: int = CR_RATE_LIMIT_MAX_RETRIES,
+    ):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.max_retries = max_retries
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = [] # Tas (priorité, ordre d'arrivée, futur)
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.throttled = 0 # Nombre de 429 reçus
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        if time.monotonic() < self._blocked_until:
+            return False
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, ticket: Optional[RequestTicket] = None):
+        """Attend un jeton ; les requêtes de même priorité sont servies dans l'ordre d'arrivée."""
+        if ticket is not None:
+            priority = ticket.priority
+        if self.rate <= 0:
+            return # Limiteur désactivé
+        if not self._waiters and self._try_take():
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if ticket is not None:
+            ticket.waiting = fut
+        try:
+            await fut
+        finally:
+            if ticket is not None:
+                ticket.waiting = None
+
+    def promote(self, ticket: RequestTicket, priority: int):
+        """Relève la priorité d'une requête ; si elle attend déjà, elle est remise en file au nouveau rang.
+
+        L'ancienne entrée reste dans le tas : son futur sera résolu via la nouvelle, puis ignoré.
+        """
+        if priority >= ticket.priority:
+            return
+        ticket.priority = priority
+        fut = ticket.waiting
+        if fut is not None and not fut.done():
+            heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+
+    async def _dispatch(self):
+        while self._waiters:
+            # Ignore les appelants qui ont abandonné (commande annulée, timeout...)
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                break
+            delay = self._blocked_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif self._try_take():
+                _, _, fut = heapq.heappop(self._waiters)
+                fut.set_result(None)
+            else:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Suspend l'émission de requêtes (réponse 429)."""
+        self.throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    def stats(self) -> Dict[str, Any]:
+        best: Dict[asyncio.Future, int] = {} # Une requête promue compte une fois, à son meilleur rang
+        for priority, _, fut in self._waiters:
+            if not fut.done() and priority < best.get(fut, priority + 1):
+                best[fut] = priority
+        queued: Dict[int, int] = {}
+        for priority in best.values():
+            queued[priority] = queued.get(priority, 0) + 1
+        return {
+            "interactive_queued": queued.get(PRIORITY_INTERACTIVE, 0),
+            "background_queued": queued.get(PRIORITY_BACKGROUND, 0),
+            "throttled": self.throttled,
+        }
+
+
+class PersistentResponseCache:
+    """Copie SQLite des réponses de l'API, relue au démarrage pour repartir à chaud.
+
+    Chaque entrée garde sa date de récupération, sa date d'expiration et l'ETag
+    renvoyé par l'API. L'expiration est paresseuse : rien n'est balayé en tâche
+    de fond, les entrées trop vieilles sont ignorées/supprimées au chargement.
+    Les écritures sont regroupées et envoyées toutes les flush_interval secondes.
+    """
+
+    CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS api_cache (
+        path TEXT NOT NULL,
+        params TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        etag TEXT,
+        PRIMARY KEY (path, params)
+    );
+    """
+
+    def __init__(self, path: str = CR_CACHE_DB_PATH, flush_interval: float = CR_CACHE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db: Optional[aiosqlite.Connection] = None
+        self._pending: Dict[Tuple, Tuple[Any, float, float, Optional[str]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _decode_rows(rows: List[Tuple]) -> List[Tuple[Tuple, Any, float, float, Optional[str]]]:
+        entries = []
+        for path, params, payload, fetched_at, expires_at, etag in rows:
+            try:
+                data = json.loads(payload)
+                key = (path, tuple(tuple(p) for p in json.loads(params)))
+            except ValueError:
+                continue
+            entries.append((key, data, fetched_at, expires_at, etag))
+        return entries
+
+    @staticmethod
+    def _encode_rows(pending: Dict[Tuple, Tuple[Any, float, float, Optional[str]]]) -> List[Tuple]:
+        return [
+            (key[0], json.dumps(key[1]), json.dumps(data, ensure_ascii=False), fetched_at, expires_at, etag)
+            for key, (data, fetched_at, expires_at, etag) in pending.items()
+        ]
+
+    async def open(self, max_age: float = CR_STALE_MAX_AGE) -> List[Tuple[Tuple, Any, float, float, Optional[str]]]:
+        """Ouvre la base et retourne les entrées encore exploitables : (clé, données, fetched_at, expires_at, etag)."""
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute(self.CREATE_SQL)
+        await self._db.execute("DELETE FROM api_cache WHERE fetched_at < ?", (time.time() - max_age,))
+        await self._db.commit()
+        async with self._db.execute(
+            "SELECT path, params, payload, fetched_at, expires_at, etag FROM api_cache"
+        ) as cur:
+            rows = await cur.fetchall()
+        entries = await asyncio.to_thread(self._decode_rows, rows)
+        self._task = asyncio.create_task(self._flush_loop())
+        return entries
+
+    def put(self, key: Tuple, data: Any, fetched_at: float, ttl: float, etag: Optional[str]):
+        """Enregistre une réponse (écrite au prochain flush)."""
+        self._pending[key] = (data, fetched_at, fetched_at + ttl, etag)
+
+    async def flush(self):
+        if not self._pending or self._db is None:
+            return
+        pending, self._pending = self._pending, {}
+        rows = await asyncio.to_thread(self._encode_rows, pending)
+        await self._db.executemany(
+            "INSERT OR REPLACE INTO api_cache(path, params, payload, fetched_at, expires_at, etag) VALUES(?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        await self._db.commit()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"⚠️ Écriture du cache API persistant impossible : {e}")
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        if self._db is not None:
+            await self.flush()
+            await self._db.close()
+            self._db = None
+
+
+def _parse_retry_after(value: Optional[str]) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return CR_RATE_LIMIT_DEFAULT_BACKOFF
+
+
+class ResponseCache:
+    """Cache LRU borné avec expiration (TTL) des réponses JSON de l'API.
+
+    Les valeurs sont partagées entre les appelants : ne pas les modifier en place.
+    """
+
+    def __init__(self, maxsize: int = CR_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0 # Requêtes servies par un appel déjà en cours
+        self.stale = 0 # Réponses périmées servies pendant une panne
+
+    def get(self, key: Tuple) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Tuple, value: Any, ttl: float):
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, path: str):
+        """Supprime toutes les entrées d'un chemin (quels que soient les paramètres)."""
+        for key in [k for k in self._data if k[0] == path]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs exposés pour suivre le quota API économisé."""
+        lookups = self.hits + self.misses + self.coalesced
+        saved = self.hits + self.coalesced
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale": self.stale,
+            "hit_rate": (saved / lookups) if lookups else 0.0,
+        }
+
+
 class CRClient:
-    """Client API Clash Royale utilisant aiohttp en gestion de contexte (async with)."""
+    """Client API Clash Royale partagé par tout le bot.
+
+    Une seule instance est créée dans bot.main (start() / close()) puis injectée
+    dans les cogs : la session aiohttp et son pool de connexions keep-alive sont
+    réutilisés d'une commande à l'autre (pas de DNS/TCP/TLS à refaire).
+    'async with CRClient() as cr:' reste possible pour un usage ponctuel (scripts).
+    """
     
-    def __init__(self, token: str = CLASH_ROYALE_TOKEN):
+    def __init__(
+        self,
+        token: str = CLASH_ROYALE_TOKEN,
+        *,
+        limit: int = CR_HTTP_LIMIT,
+        limit_per_host: int = CR_HTTP_LIMIT_PER_HOST,
+        dns_ttl: int = CR_DNS_TTL,
+        keepalive_timeout: float = CR_KEEPALIVE_TIMEOUT,
+        timeout: float = CR_HTTP_TIMEOUT,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_attempts: int = CR_RETRY_ATTEMPTS,
+        breaker: Optional[CircuitBreaker] = None,
+        persistent: Optional[PersistentResponseCache] = None,
+    ):
         self.token = token
-        self.session: Optional[aiohttp.ClientSession] = None # Sera créé dans __aenter__
+        self.session: Optional[aiohttp.ClientSession] = None # Sera créé dans start()
         self.headers = {
             "Authorization": f"Bearer {self.token}",
             "Accept": "application/json"
         }
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=CR_HTTP_CONNECT_TIMEOUT)
+        # Cache TTL + fusion des requêtes identiques simultanées (single-flight)
+        self.cache = cache if cache is not None else ResponseCache()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._tickets: Dict[Tuple, RequestTicket] = {} # Priorité courante de chaque requête en vol
+        # Limiteur de débit partagé par toutes les requêtes du client
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        # Résilience : nouvelles tentatives + disjoncteur + dernière réponse valide par clé
+        self.retry_attempts = max(1, retry_attempts)
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._last_good = ResponseCache(maxsize=self.cache.maxsize) # clé -> (fetched_at, données, etag)
+        # Copie disque optionnelle (démarrage à chaud après un redémarrage)
+        self.persistent = persistent
+        # Abonnés notifiés de chaque Player/Clan frais reçu (ex. cache joueur -> clan)
+        self._observers: List[Callable[[Any], None]] = []
+
+    def add_observer(self, callback: Callable[[Any], None]):
+        """callback(model) est appelé pour chaque Player ou Clan reçu de l'API (pas pour les lectures du cache)."""
+        self._observers.append(callback)
+
+    def _notify(self, model: Any) -> Any:
+        if not is_stale(model):
+            for callback in self._observers:
+                try:
+                    callback(model)
+                except Exception as e:
+                    logger.warning(f"⚠️ Abonné {callback!r} en erreur : {e}")
+        return model
+
+    async def start(self):
+        """Ouvre la session HTTP longue durée (idempotent)."""
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+            enable_cleanup_closed=True,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=self.timeout,
+        )
+        if self.persistent is not None:
+            await self._warm_from_disk()
+
+    async def _warm_from_disk(self):
+        """Recharge les réponses persistées dans le cache mémoire et le stock de secours."""
+        now = time.time()
+        entries = await self.persistent.open()
+        for key, data, fetched_at, expires_at, etag in entries:
+            schema = self._schema_for(key[0])
+            if schema is not None:
+                try:
+                    data = schema.load(data)
+                except (AttributeError, TypeError):
+                    continue # Entrée illisible (ancien format) : ignorée
+            if expires_at > now:
+                self.cache.set(key, data, expires_at - now)
+            self._last_good.set(key, (fetched_at, data, etag), CR_STALE_MAX_AGE - (now - fetched_at))
+
+    async def close(self):
+        """Ferme la session, libère le pool de connexions et vide le cache persistant sur disque."""
+        # Requêtes partagées encore en vol (protégées par shield) : annulées avec le client
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._inflight:
+            await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        if self.persistent is not None:
+            await self.persistent.close()
 
     # Méthode d'entrée pour 'async with' (crée la session)
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        await self.start()
         return self
 
     # Méthode de sortie pour 'async with' (ferme la session)
     async def __aexit__(self, exc_type, exc, tb):
-        if self.session and not self.session.closed:
-            await self.session.close()
+        await self.close()
 
-    async def _get(self, path: str, params: Optional[Dict] = None) -> Dict[str, Any]:
+    @staticmethod
+    def _ttl_for(path: str) -> float:
+        for pattern, ttl in ENDPOINT_TTLS:
+            if pattern.match(path):
+                return ttl
+        return 0
+
+    @staticmethod
+    def _schema_for(path: str) -> Optional[_Schema]:
+        for pattern, schema in ENDPOINT_SCHEMAS:
+            if pattern.match(path):
+                return schema
+        return None
+
+    @staticmethod
+    def _cache_key(path: str, params: Optional[Dict]) -> Tuple:
+        return (path, tuple(sorted(params.items())) if params else ())
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+    async def _get(
+        self, path: str, params: Optional[Dict] = None, priority: int = PRIORITY_INTERACTIVE
+    ) -> Any:
+        """GET avec cache : retourne un modèle typé (Player, Clan...) ou le JSON brut."""
+        key = self._cache_key(path, params)
+        cached = self.cache.get(key)
+        if cached is not _MISSING:
+            self.cache.hits += 1
+            return cached
+
+        # Une requête identique est déjà en vol : on attend son résultat
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.cache.coalesced += 1
+            # Une commande qui rejoint une requête de fond ne reste pas derrière la file basse priorité
+            self.rate_limiter.promote(self._tickets[key], priority)
+            return await asyncio.shield(inflight)
+
+        self.cache.misses += 1
+        ticket = RequestTicket(priority)
+        task = asyncio.ensure_future(self._fetch_and_store(key, path, params, ticket))
+        self._inflight[key] = task
+        self._tickets[key] = ticket
+        task.add_done_callback(lambda t: self._on_inflight_done(key, t))
+        # shield : l'annulation d'un appelant n'annule pas la requête partagée
+        return await asyncio.shield(task)
+
+    def _on_inflight_done(self, key: Tuple, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        self._tickets.pop(key, None)
+        if not task.cancelled():
+            task.exception() # Marque l'erreur comme lue si tous les appelants ont abandonné
+
+    async def _fetch_and_store(
+        self, key: Tuple, path: str, params: Optional[Dict], ticket: RequestTicket
+    ) -> Any:
+        last_good = self._last_good.get(key)
+        etag = last_good[2] if last_good is not _MISSING else None
+        try:
+            data, etag = await self._fetch_with_retry(path, params, ticket, etag)
+        except CRUnavailableError:
+            # API en panne : on sert la dernière réponse valide, marquée comme périmée
+            if last_good is _MISSING:
+                raise
+            self.cache.stale += 1
+            fetched_at, payload, _ = last_good
+            return _mark_stale(payload, fetched_at)
+        schema = self._schema_for(path)
+        if data is _NOT_MODIFIED:
+            data = last_good[1] # 304 : la copie connue est toujours à jour
+        elif schema is not None:
+            data = schema.parse(data) # Modèle compact : le JSON brut n'est pas conservé
+        fetched_at = time.time()
+        ttl = self._ttl_for(path)
+        self.cache.set(key, data, ttl)
+        self._last_good.set(key, (fetched_at, data, etag), CR_STALE_MAX_AGE)
+        if self.persistent is not None:
+            self.persistent.put(key, schema.dump(data) if schema is not None else data, fetched_at, ttl, etag)
+        if isinstance(data, (Player, Clan)):
+            self._notify(data) # Réponse fraîche uniquement : une copie en cache n'apprend rien de neuf
+        return data
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # Backoff exponentiel avec gigue complète (évite les vagues synchronisées)
+        return random.uniform(0, min(CR_RETRY_MAX_DELAY, CR_RETRY_BASE_DELAY * (2 ** attempt)))
+
+    async def _fetch_with_retry(
+        self, path: str, params: Optional[Dict], ticket: RequestTicket, etag: Optional[str] = None
+    ) -> Tuple[Any, Optional[str]]:
+        """GET idempotent : nouvelles tentatives sur erreurs transitoires, sous contrôle du disjoncteur."""
+        last_error: Optional[CRUnavailableError] = None
+        for attempt in range(self.retry_attempts):
+            if not self.breaker.allow_request():
+                raise CRUnavailableError("Clash Royale API unavailable (circuit open)")
+            try:
+                result = await self._fetch(path, params, ticket, etag)
+            except CRRateLimitError:
+                self.breaker.record_success() # L'API répond (429) : pas de nouvel essai
+                raise
+            except CRUnavailableError as e:
+                self.breaker.record_failure()
+                last_error = e
+                if attempt + 1 < self.retry_attempts:
+                    await asyncio.sleep(self._backoff(attempt))
+                continue
+            except CRApiError:
+                self.breaker.record_success() # 404/403... : l'API est joignable
+                raise
+            finally:
+                # Autre sortie (annulation, JSON invalide, client non démarré) : la requête
+                # de test ne doit pas rester réservée, sinon le circuit ne se referme jamais
+                self.breaker.release_probe()
+            self.breaker.record_success()
+            return result
+        raise last_error
+
+    async def _fetch(
+        self,
+        path: str,
+        params: Optional[Dict] = None,
+        ticket: Optional[RequestTicket] = None,
+        etag: Optional[str] = None,
+    ) -> Tuple[Any, Optional[str]]:
+        """Un GET brut ; retourne (données ou _NOT_MODIFIED, ETag de la réponse)."""
+        ticket = ticket if ticket is not None else RequestTicket()
         url = BASE + path
+        # Requête conditionnelle si l'on connaît déjà une version de la ressource
+        headers = {"If-None-Match": etag} if etag else None
         
         if self.session is None:
-            # Sécurité si on oublie le 'async with'
-            raise RuntimeError("CRClient doit être utilisé dans un bloc 'async with CRClient() as cr:'.")
-            
-        async with self.session.get(url, headers=self.headers, params=params) as r:
-            if r.status == 200:
-                return await r.json()
-            elif r.status == 404:
-                raise CRApiError(f"Not found: {url}")
-            elif r.status == 401 or r.status == 403:
-                # Si le jeton est mauvais OU si l'IP n'est pas autorisée (Render)
-                raise CRApiError("Auth error with Clash Royale API (check token and IP settings on Supercell site)")
-            else:
-                text = await r.text()
-                raise CRApiError(f"CR API error {r.status}: {text}")
+            # Sécurité si on oublie start() / 'async with'
+            raise RuntimeError("CRClient non démarré : appeler 'await cr.start()' ou utiliser 'async with CRClient() as cr:'.")
 
-    async def get_player(self, tag: str) -> Dict[str, Any]:
+        for _ in range(self.rate_limiter.max_retries + 1):
+            await self.rate_limiter.acquire(ticket=ticket)
+            try:
+                async with self.session.get(url, params=params, headers=headers) as r:
+                    if r.status == 200:
+                        return await r.json(), r.headers.get("ETag")
+                    elif r.status == 304:
+                        return _NOT_MODIFIED, etag
+                    elif r.status == 429:
+                        # Quota dépassé : pause globale puis remise en file (pas d'échec immédiat)
+                        self.rate_limiter.pause(_parse_retry_after(r.headers.get("Retry-After")))
+                        continue
+                    elif r.status == 404:
+                        raise CRApiError(f"Not found: {url}")
+                    elif r.status == 401 or r.status == 403:
+                        # Si le jeton est mauvais OU si l'IP n'est pas autorisée (Render)
+                        raise CRApiError("Auth error with Clash Royale API (check token and IP settings on Supercell site)")
+                    elif r.status >= 500:
+                        text = await r.text()
+                        raise CRUnavailableError(f"CR API error {r.status}: {text}")
+                    else:
+                        text = await r.text()
+                        raise CRApiError(f"CR API error {r.status}: {text}")
+            except asyncio.TimeoutError:
+                raise CRUnavailableError(f"CR API timeout: {url}")
+            except aiohttp.ClientError as e:
+                raise CRUnavailableError(f"CR API connection error: {e}")
+        raise CRRateLimitError(f"Rate limited by Clash Royale API: {url}")
+
+    async def get_player(self, tag: str, priority: int = PRIORITY_INTERACTIVE) -> Player:
         tag = tag.strip("#").upper()
-        return await self._get(f"/players/%23{tag}")
+        return await self._get(f"/players/%23{tag}", priority=priority)
 
-    async def get_clan(self, tag: str) -> Dict[str, Any]:
+    async def get_clan(self, tag: str, priority: int = PRIORITY_INTERACTIVE) -> Clan:
         tag = tag.strip("#").upper()
-        return await self._get(f"/clans/%23{tag}")
-
-    async def get_card(self, name: str) -> Dict[str, Any]:
-        data = await self._get("/cards")
-        name_lower = name.strip().lower()
-        for card in data.get("items", data):
-            if card.get("name", "").lower() == name_lower:
-                return card
-        raise CRApiError(f"Card '{name}' not found")
-    
-    async def get_upcoming_chests(self, tag: str) -> Dict[str, Any]:
+        return await self._get(f"/clans/%23{tag}", priority=priority)
+
+    async def get_cards(self, priority: int = PRIORITY_INTERACTIVE) -> List[Dict[str, Any]]:
+        """Liste complète des cartes (préférer CardCatalog pour les recherches)."""
+        data = await self._get("/cards", priority=priority)
+        return data.get("items", [])
+
+    async def get_upcoming_chests(self, tag: str, priority: int = PRIORITY_INTERACTIVE) -> Dict[str, Any]:
         tag = tag.strip("#").upper()
-        return await self._get(f"/players/%23{tag}/upcomingchests")
+        return await self._get(f"/players/%23{tag}/upcomingchests", priority=priority)
 
-    async def get_battle_log(self, tag: str) -> List[Dict[str, Any]]:
+    async def get_battle_log(self, tag: str, priority: int = PRIORITY_INTERACTIVE) -> Tuple[Battle, ...]:
         tag = tag.strip("#").upper()
-        return await self._get(f"/players/%23{tag}/battlelog")
+        return await self._get(f"/players/%23{tag}/battlelog", priority=priority)
     
-    async def get_current_river_race(self, tag: str) -> Dict[str, Any]:
+    async def get_current_river_race(self, tag: str, priority: int = PRIORITY_INTERACTIVE) -> RiverRace:
         tag = tag.strip("#").upper()
-        return await self._get(f"/clans/%23{tag}/currentriverrace") 
+        return await self._get(f"/clans/%23{tag}/currentriverrace", priority=priority) 
 
-    async def get_clan_war_log(self, tag: str) -> List[Dict[str, Any]]:
+    async def get_clan_war_log(self, tag: str, priority: int = PRIORITY_INTERACTIVE) -> Tuple[RiverRace, ...]:
         tag = tag.strip("#").upper()
-        # L'API retourne une liste d'éléments (items)
-        data = await self._get(f"/clans/%23{tag}/warlog")
-        return data.get('items', [])
\ No newline at end of file
+        # L'API retourne une liste d'éléments (items), convertis en RiverRace
+        return await self._get(f"/clans/%23{tag}/warlog", priority=priority)
\ No newline at end of file
@@ -1,38 +1,385 @@
-# db.py -- stockage simple des tags (discord_id -> clash tag)
+# db.py -- stockage simple des tags (discord_id -> clash tag), historique des joueurs/clans et combats
+import asyncio
+import json
+import time
 import aiosqlite
-from config import DB_PATH # DB_PATH doit être défini dans config.py
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import ( # DB_PATH doit être défini dans config.py
+    DB_PATH, USER_CACHE_MAXSIZE, SNAPSHOT_DOWNSAMPLE_AFTER, SNAPSHOT_KEYFRAME_EVERY
+)
 
 CREATE_SQL = """
 CREATE TABLE IF NOT EXISTS users (
     discord_id INTEGER PRIMARY KEY,
     cr_tag TEXT NOT NULL
 );
+CREATE INDEX IF NOT EXISTS idx_users_cr_tag ON users(cr_tag);
+
+-- Historique encodé en deltas : une ligne « keyframe » contient toutes les valeurs,
+-- les suivantes seulement les champs modifiés. La clé primaire sert aux requêtes par période.
+CREATE TABLE IF NOT EXISTS snapshots (
+    kind TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    taken_at INTEGER NOT NULL,
+    is_keyframe INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (kind, tag, taken_at)
+) WITHOUT ROWID;
+
+-- Combats des comptes liés, au-delà des 25 gardés par l'API (dédoublonnés par la clé primaire)
+CREATE TABLE IF NOT EXISTS battles (
+    player_tag TEXT NOT NULL,
+    battle_time TEXT NOT NULL,
+    type TEXT,
+    team_crowns INTEGER,
+    opponent_crowns INTEGER,
+    opponent_name TEXT,
+    team_deck TEXT NOT NULL,
+    PRIMARY KEY (player_tag, battle_time)
+) WITHOUT ROWID;
 """
 
+# Réglages appliqués à l'ouverture de la connexion
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",    # Lectures non bloquées par les écritures
+    "PRAGMA synchronous=NORMAL",  # Suffisant (et bien plus rapide) en mode WAL
+    "PRAGMA cache_size=-8000",    # ~8 Mo de cache de pages
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Requêtes constantes : sqlite3 garde leur version préparée en cache (cached_statements)
+UPSERT_USER_SQL = "INSERT INTO users(discord_id, cr_tag) VALUES(?, ?) ON CONFLICT(discord_id) DO UPDATE SET cr_tag=excluded.cr_tag"
+SELECT_USER_TAG_SQL = "SELECT cr_tag FROM users WHERE discord_id = ?"
+SELECT_ALL_USERS_SQL = "SELECT discord_id, cr_tag FROM users"
+
+# Taille max d'une liste IN (...) : reste sous la limite de variables de SQLite
+MAX_SQL_VARIABLES = 500
+
+
+class Database:
+    """Connexion aiosqlite unique, ouverte par init_db() et fermée par close_db().
+
+    Évite d'ouvrir le fichier (et de démarrer un thread) à chaque requête.
+    Les écritures passent par un verrou pour que chaque transaction reste atomique.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self.conn: Optional[aiosqlite.Connection] = None
+        self.write_lock = asyncio.Lock()
+
+    async def open(self):
+        if self.conn is not None:
+            return
+        # Cache de requêtes préparées plus grand que celui de sqlite3 (128) : toutes les
+        # requêtes du bot (liens, instantanés, combats, cache API) y restent compilées
+        self.conn = await aiosqlite.connect(self.path, cached_statements=256)
+        for pragma in PRAGMAS:
+            await self.conn.execute(pragma)
+        await self.conn.executescript(CREATE_SQL)
+        await self.conn.commit()
+
+    async def close(self):
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    def _require_conn(self) -> aiosqlite.Connection:
+        if self.conn is None:
+            raise RuntimeError("Base de données non initialisée : appeler 'await init_db()' au démarrage.")
+        return self.conn
+
+    async def execute_write(self, sql: str, params: Iterable[Any] = ()):
+        conn = self._require_conn()
+        async with self.write_lock:
+            await conn.execute(sql, params)
+            await conn.commit()
+
+    async def execute_many_write(self, statements: Iterable[Tuple[str, Iterable[Any]]]):
+        """Exécute plusieurs requêtes d'écriture dans une seule transaction."""
+        conn = self._require_conn()
+        async with self.write_lock:
+            try:
+                for sql, params in statements:
+                    await conn.execute(sql, params)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def executemany_write(self, sql: str, rows: List[Iterable[Any]]) -> int:
+        """Insertion groupée en une transaction ; retourne le nombre de lignes modifiées."""
+        conn = self._require_conn()
+        async with self.write_lock:
+            before = conn.total_changes
+            try:
+                await conn.executemany(sql, rows)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            return conn.total_changes - before
+
+    async def fetchone(self, sql: str, params: Iterable[Any] = ()) -> Optional[Tuple]:
+        async with self._require_conn().execute(sql, params) as cur:
+            return await cur.fetchone()
+
+    async def fetchall(self, sql: str, params: Iterable[Any] = ()) -> List[Tuple]:
+        async with self._require_conn().execute(sql, params) as cur:
+            return await cur.fetchall()
+
+
+class UserTagCache:
+    """Copie mémoire de la table users (discord_id -> tag), alimentée en écriture directe.
+
+    Sans limite (maxsize=0), la table entière est chargée : une absence signifie
+    « compte non lié » et ne coûte aucune requête. Avec une limite, les liens les
+    moins utilisés sont évincés (LRU) et une absence retombe sur SQLite.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._tags: "OrderedDict[int, str]" = OrderedDict()
+        self.complete = False # Vrai si toute la table est en mémoire
+
+    def load(self, rows: Iterable[Tuple[int, str]]):
+        self._tags.clear()
+        self.complete = True
+        for discord_id, tag in rows:
+            self.set(discord_id, tag)
+
+    def get(self, discord_id: int) -> Optional[str]:
+        tag = self._tags.get(discord_id)
+        if tag is not None:
+            self._tags.move_to_end(discord_id)
+        return tag
+
+    def set(self, discord_id: int, tag: str):
+        self._tags[discord_id] = tag
+        self._tags.move_to_end(discord_id)
+        if self.maxsize and len(self._tags) > self.maxsize:
+            self._tags.popitem(last=False)
+            self.complete = False # Des liens existent désormais hors mémoire
+
+    def items(self) -> Dict[int, str]:
+        """Copie des liens en mémoire (sans toucher à l'ordre LRU)."""
+        return dict(self._tags)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+
+# Instances partagées par tout le bot
+db = Database()
+user_tags = UserTagCache()
+
+
 async def init_db():
-    """Initialise la base de données (crée le fichier et la table si nécessaire)."""
-    # aiosqlite.connect est déjà asynchrone
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(CREATE_SQL)
-        await db.commit()
+    """Ouvre la connexion partagée (crée le fichier et la table si nécessaire) et charge les liens en mémoire."""
+    await db.open()
+    user_tags.load(await db.fetchall(SELECT_ALL_USERS_SQL))
+
+async def close_db():
+    """Ferme proprement la connexion partagée (appelé à l'arrêt du bot)."""
+    await db.close()
+
+def clean_tag(tag: str) -> str:
+    """Forme canonique d'un tag (sans « # », en majuscules), partagée par tous les modules."""
+    return tag.strip().replace("#", "").upper()
 
 async def set_user_tag(discord_id: int, tag: str):
     """Sauvegarde ou met à jour le tag CR d'un utilisateur."""
-    # Nettoyage du tag (retire # et met en majuscules)
-    clean_tag = tag.upper().replace("#","")
-    
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Utilise ON CONFLICT (UPSERT) pour insérer ou mettre à jour
-        await db.execute(
-            "INSERT INTO users(discord_id, cr_tag) VALUES(?, ?) ON CONFLICT(discord_id) DO UPDATE SET cr_tag=excluded.cr_tag", 
-            (discord_id, clean_tag)
-        )
-        await db.commit()
+    tag = clean_tag(tag)
+
+    # Utilise ON CONFLICT (UPSERT) pour insérer ou mettre à jour, puis met à jour la copie mémoire
+    await db.execute_write(UPSERT_USER_SQL, (discord_id, tag))
+    user_tags.set(discord_id, tag)
 
 async def get_user_tag(discord_id: int) -> str | None:
-    """Récupère le tag CR d'un utilisateur Discord."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT cr_tag FROM users WHERE discord_id = ?", (discord_id,))
-        row = await cur.fetchone()
-        # Retourne le tag ou None si non trouvé
-        return None if row is None else row[0]
\ No newline at end of file
+    """Récupère le tag CR d'un utilisateur Discord (depuis la mémoire dans le cas courant)."""
+    tag = user_tags.get(discord_id)
+    if tag is not None or user_tags.complete:
+        return tag
+    # Cache borné : le lien a pu être évincé, on relit SQLite
+    row = await db.fetchone(SELECT_USER_TAG_SQL, (discord_id,))
+    if row is None:
+        return None
+    user_tags.set(discord_id, row[0])
+    return row[0]
+
+async def get_all_user_tags() -> Dict[int, str]:
+    """Tous les liens discord_id -> tag (pour les tâches de fond)."""
+    if user_tags.complete:
+        return user_tags.items()
+    return {discord_id: tag for discord_id, tag in await db.fetchall(SELECT_ALL_USERS_SQL)}
+
+def _chunks(values: List[Any]) -> Iterable[List[Any]]:
+    for i in range(0, len(values), MAX_SQL_VARIABLES):
+        yield values[i:i + MAX_SQL_VARIABLES]
+
+async def get_user_tags(discord_ids: Iterable[int]) -> Dict[int, str]:
+    """Tags CR de plusieurs utilisateurs Discord en une seule requête (les non-liés sont absents)."""
+    result: Dict[int, str] = {}
+    missing: List[int] = []
+    for discord_id in set(discord_ids):
+        tag = user_tags.get(discord_id)
+        if tag is not None:
+            result[discord_id] = tag
+        elif not user_tags.complete:
+            missing.append(discord_id)
+    for chunk in _chunks(missing):
+        placeholders = ",".join("?" * len(chunk))
+        rows = await db.fetchall(f"SELECT discord_id, cr_tag FROM users WHERE discord_id IN ({placeholders})", chunk)
+        for discord_id, tag in rows:
+            user_tags.set(discord_id, tag)
+            result[discord_id] = tag
+    return result
+
+async def get_discord_ids_for_tags(tags: Iterable[str]) -> Dict[str, List[int]]:
+    """Index inverse : tag CR (sans '#', majuscules) -> utilisateurs Discord liés, via idx_users_cr_tag."""
+    clean_tags = list({clean_tag(t) for t in tags if t})
+    result: Dict[str, List[int]] = {}
+    for chunk in _chunks(clean_tags):
+        placeholders = ",".join("?" * len(chunk))
+        rows = await db.fetchall(f"SELECT cr_tag, discord_id FROM users WHERE cr_tag IN ({placeholders})", chunk)
+        for tag, discord_id in rows:
+            result.setdefault(tag, []).append(discord_id)
+    return result
+
+# --- Historique : instantanés encodés en deltas ---
+SNAPSHOT_CHAIN_SQL = """
+SELECT taken_at, is_keyframe, data FROM snapshots
+WHERE kind = ? AND tag = ? AND taken_at <= ? AND taken_at >= COALESCE(
+    (SELECT MAX(taken_at) FROM snapshots WHERE kind = ? AND tag = ? AND is_keyframe = 1 AND taken_at <= ?), 0)
+ORDER BY taken_at
+"""
+INSERT_SNAPSHOT_SQL = "INSERT OR REPLACE INTO snapshots(kind, tag, taken_at, is_keyframe, data) VALUES(?, ?, ?, ?, ?)"
+
+DAY = 86400
+
+# (kind, tag) -> (dernier état complet, nombre de deltas depuis la dernière keyframe)
+_snapshot_states: Dict[Tuple[str, str], Tuple[Dict[str, Any], int]] = {}
+
+def _replay(rows: Iterable[Tuple[int, int, str]]) -> List[Tuple[int, Dict[str, Any], int]]:
+    """Reconstruit les états complets : [(taken_at, état, deltas depuis la keyframe)]."""
+    states = []
+    state: Dict[str, Any] = {}
+    since_keyframe = 0
+    for taken_at, is_keyframe, data in rows:
+        values = json.loads(data)
+        if is_keyframe:
+            state = values
+            since_keyframe = 0
+        else:
+            state = {**state, **values}
+            since_keyframe += 1
+        states.append((taken_at, state, since_keyframe))
+    return states
+
+async def _load_chain(kind: str, tag: str, start: int, until: int) -> List[Tuple[int, Dict[str, Any], int]]:
+    """États entre la dernière keyframe antérieure à start et until."""
+    rows = await db.fetchall(SNAPSHOT_CHAIN_SQL, (kind, tag, until, kind, tag, start))
+    return _replay(rows)
+
+async def record_snapshot(kind: str, tag: str, values: Dict[str, Any], taken_at: Optional[int] = None) -> bool:
+    """Enregistre un instantané ('player' ou 'clan'). Retourne False si rien n'a changé (aucune ligne écrite)."""
+    tag = clean_tag(tag)
+    taken_at = int(taken_at if taken_at is not None else time.time())
+    key = (kind, tag)
+    if key not in _snapshot_states:
+        chain = await _load_chain(kind, tag, taken_at, taken_at)
+        _snapshot_states[key] = (chain[-1][1], chain[-1][2]) if chain else ({}, 0)
+    state, since_keyframe = _snapshot_states[key]
+
+    delta = {k: v for k, v in values.items() if k not in state or state[k] != v}
+    if state and not delta:
+        return False # Champs inchangés : ne coûte rien
+    is_keyframe = not state or since_keyframe + 1 >= SNAPSHOT_KEYFRAME_EVERY
+    payload = values if is_keyframe else delta
+    await db.execute_write(INSERT_SNAPSHOT_SQL, (kind, tag, taken_at, int(is_keyframe), json.dumps(payload)))
+    _snapshot_states[key] = ({**state, **values}, 0 if is_keyframe else since_keyframe + 1)
+    return True
+
+async def get_snapshots(kind: str, tag: str, start: int, end: Optional[int] = None) -> List[Tuple[int, Dict[str, Any]]]:
+    """États complets enregistrés entre start et end (epoch), précédés du dernier état antérieur à start s'il existe."""
+    tag = clean_tag(tag)
+    end = int(end if end is not None else time.time())
+    chain = await _load_chain(kind, tag, start, end)
+    points: List[Tuple[int, Dict[str, Any]]] = []
+    for i, (taken_at, state, _) in enumerate(chain):
+        if taken_at >= start:
+            if not points and i > 0:
+                points.append((chain[i - 1][0], chain[i - 1][1])) # Valeur de départ
+            points.append((taken_at, state))
+    if not points and chain:
+        points.append((chain[-1][0], chain[-1][1])) # Aucun changement sur la période
+    return points
+
+async def downsample_snapshots(older_than: float = SNAPSHOT_DOWNSAMPLE_AFTER, now: Optional[float] = None) -> int:
+    """Ne garde qu'un point par jour (le dernier) pour les jours plus anciens que older_than.
+
+    Les lignes fusionnées sont réécrites (keyframe puis deltas) pour que la chaîne reste valide.
+    Retourne le nombre de lignes supprimées.
+    """
+    now = now if now is not None else time.time()
+    cutoff = int((now - older_than) // DAY * DAY) # Jours complets uniquement
+    keys = await db.fetchall(
+        "SELECT DISTINCT kind, tag FROM snapshots WHERE taken_at < ? "
+        "GROUP BY kind, tag, taken_at / ? HAVING COUNT(*) > 1",
+        (cutoff, DAY),
+    )
+    removed = 0
+    for kind, tag in keys:
+        rows = await db.fetchall(
+            "SELECT taken_at, is_keyframe, data FROM snapshots WHERE kind = ? AND tag = ? AND taken_at < ? ORDER BY taken_at",
+            (kind, tag, cutoff),
+        )
+        daily: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+        for taken_at, state, _ in _replay(rows):
+            daily[taken_at // DAY] = (taken_at, state) # Le dernier point du jour l'emporte
+
+        statements: List[Tuple[str, Iterable[Any]]] = [
+            ("DELETE FROM snapshots WHERE kind = ? AND tag = ? AND taken_at < ?", (kind, tag, cutoff))
+        ]
+        previous: Dict[str, Any] = {}
+        kept = 0
+        for taken_at, state in (daily[d] for d in sorted(daily)):
+            delta = {k: v for k, v in state.items() if k not in previous or previous[k] != v}
+            if previous and not delta:
+                continue
+            is_keyframe = not previous
+            statements.append((INSERT_SNAPSHOT_SQL, (kind, tag, taken_at, int(is_keyframe), json.dumps(state if is_keyframe else delta))))
+            previous = state
+            kept += 1
+        await db.execute_many_write(statements)
+        removed += len(rows) - kept
+    return removed
+
+
+# --- Combats (journal étendu des comptes liés) ---
+INSERT_BATTLE_SQL = (
+    "INSERT OR IGNORE INTO battles(player_tag, battle_time, type, team_crowns, opponent_crowns, opponent_name, team_deck) "
+    "VALUES(?, ?, ?, ?, ?, ?, ?)"
+)
+SELECT_BATTLES_SQL = (
+    "SELECT battle_time, type, team_crowns, opponent_crowns, opponent_name, team_deck FROM battles "
+    "WHERE player_tag = ? ORDER BY battle_time DESC LIMIT ?"
+)
+
+async def insert_battles(rows: List[Tuple[str, str, Optional[str], Optional[int], Optional[int], Optional[str], str]]) -> int:
+    """Insère des combats (tag, battle_time, type, couronnes, couronnes adverses, adversaire, deck JSON)
+    en une seule transaction ; les doublons (tag, battle_time) sont ignorés. Retourne le nombre ajouté."""
+    if not rows:
+        return 0
+    return await db.executemany_write(INSERT_BATTLE_SQL, [(clean_tag(r[0]),) + tuple(r[1:]) for r in rows])
+
+async def get_latest_battle_times() -> Dict[str, str]:
+    """Dernier battle_time enregistré par joueur (reprise de l'ingestion après un redémarrage)."""
+    return dict(await db.fetchall("SELECT player_tag, MAX(battle_time) FROM battles GROUP BY player_tag"))
+
+async def get_battles(tag: str, limit: int = 200) -> List[Tuple[str, Optional[str], Optional[int], Optional[int], Optional[str], List[str]]]:
+    """Combats enregistrés du joueur, du plus récent au plus ancien (deck décodé)."""
+    rows = await db.fetchall(SELECT_BATTLES_SQL, (clean_tag(tag), limit))
+    return [row[:5] + (json.loads(row[5]),) for row in rows]
\ No newline at end of file
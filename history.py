@@ -0,0 +1,98 @@
+# history.py -- enregistrement périodique de l'historique des joueurs liés et de leurs clans
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Set
+from background import PeriodicService
+from cr_api import CRClient, CRApiError, Player, Clan, PRIORITY_BACKGROUND, is_stale
+from config import SNAPSHOT_INTERVAL, SNAPSHOT_CONCURRENCY
+from db import get_all_user_tags, record_snapshot, downsample_snapshots, DAY
+
+logger = logging.getLogger("dh2.history")
+
+
+def player_snapshot(p: Player) -> Dict[str, Any]:
+    return {
+        "trophies": p.trophies,
+        "best_trophies": p.best_trophies,
+        "exp_level": p.exp_level,
+        "wins": p.wins,
+        "losses": p.losses,
+        "battle_count": p.battle_count,
+        "three_crown_wins": p.three_crown_wins,
+        "donations": p.donations,
+        "clan_tag": p.clan_tag,
+    }
+
+def clan_snapshot(c: Clan) -> Dict[str, Any]:
+    return {
+        "clan_score": c.clan_score,
+        "clan_war_trophies": c.clan_war_trophies,
+        "members_count": c.members_count,
+        "donations": sum(m.donations for m in c.members),
+    }
+
+
+class SnapshotRecorder(PeriodicService):
+    """Prend un instantané des joueurs liés (et de leurs clans) toutes les `interval` secondes.
+
+    Les appels passent par la file basse priorité du limiteur : les commandes restent prioritaires.
+    Une fois par jour, les points de plus de SNAPSHOT_DOWNSAMPLE_AFTER sont réduits à un par jour.
+    """
+
+    logger = logger
+    failure_message = "Enregistrement de l'historique échoué"
+
+    def __init__(self, cr: CRClient, interval: float = SNAPSHOT_INTERVAL, concurrency: int = SNAPSHOT_CONCURRENCY):
+        super().__init__()
+        self.cr = cr
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        self.last_downsample: float = 0.0
+
+    async def _record_player(self, tag: str, sem: asyncio.Semaphore, clans: Set[str]) -> bool:
+        async with sem:
+            try:
+                p = await self.cr.get_player(tag, priority=PRIORITY_BACKGROUND)
+            except CRApiError as e:
+                logger.debug(f"Instantané joueur {tag} ignoré : {e}")
+                return False
+        if is_stale(p):
+            return False # Copie de secours : pas une nouvelle mesure
+        if p.clan_tag:
+            clans.add(p.clan_tag)
+        return await record_snapshot("player", p.tag or tag, player_snapshot(p))
+
+    async def _record_clan(self, tag: str, sem: asyncio.Semaphore) -> bool:
+        async with sem:
+            try:
+                c = await self.cr.get_clan(tag, priority=PRIORITY_BACKGROUND)
+            except CRApiError as e:
+                logger.debug(f"Instantané clan {tag} ignoré : {e}")
+                return False
+        if is_stale(c):
+            return False
+        return await record_snapshot("clan", c.tag or tag, clan_snapshot(c))
+
+    async def run_once(self) -> int:
+        """Un passage complet ; retourne le nombre de lignes écrites."""
+        started = time.perf_counter()
+        sem = asyncio.Semaphore(self.concurrency)
+        clans: Set[str] = set()
+        tags = set((await get_all_user_tags()).values())
+        written = await asyncio.gather(*(self._record_player(t, sem, clans) for t in tags))
+        written += await asyncio.gather(*(self._record_clan(t, sem) for t in clans))
+        count = sum(bool(w) for w in written)
+        logger.info(
+            f"📈 Historique : {count} instantanés écrits ({len(tags)} joueurs, {len(clans)} clans) "
+            f"en {time.perf_counter() - started:.1f}s."
+        )
+        if time.time() - self.last_downsample >= DAY:
+            removed = await downsample_snapshots()
+            self.last_downsample = time.time()
+            if removed:
+                logger.info(f"🗜️ Historique : {removed} points anciens fusionnés (1 par jour).")
+        return count
+
+    def next_delay(self) -> float:
+        return self.interval
\ No newline at end of file
@@ -0,0 +1,136 @@
+# participation.py -- suivi structuré de la participation aux courses fluviales (decks, points, deltas)
+import time
+from typing import Optional, Dict, Iterable, List, Tuple
+from cr_api import Participant
+from config import PARTICIPATION_RETENTION
+from db import clean_tag
+
+FAME_PER_DECK = 750 # Points moyens rapportés par un deck joué
+MAX_DECK_SLOTS = 4  # Decks jouables par jour de guerre
+
+
+def remaining_decks(decks_used_today: Optional[int], decks_used: Optional[int], fame: int) -> int:
+    """Decks restants : decksUsedToday de l'API, sinon decksUsed (course terminée), sinon estimation par les points."""
+    used = decks_used_today if decks_used_today is not None else decks_used
+    if used is None:
+        used = min(MAX_DECK_SLOTS, fame // FAME_PER_DECK)
+    return max(0, min(MAX_DECK_SLOTS, MAX_DECK_SLOTS - used))
+
+
+class MemberParticipation:
+    """Participation d'un membre dans la course en cours, avec l'écart depuis la récupération précédente."""
+    __slots__ = (
+        "tag", "name", "fame", "decks_used", "decks_used_today",
+        "decks_delta", "fame_delta", "last_seen",
+    )
+
+    def __init__(self, tag: str, name: Optional[str]):
+        self.tag = tag
+        self.name = name
+        self.fame = 0
+        self.decks_used: Optional[int] = None
+        self.decks_used_today: Optional[int] = None
+        self.decks_delta = 0
+        self.fame_delta = 0
+        self.last_seen = 0.0 # Dernière réponse de l'API contenant ce membre
+
+    @property
+    def remaining_decks(self) -> int:
+        return remaining_decks(self.decks_used_today, self.decks_used, self.fame)
+
+    def update(self, p: Participant, now: float) -> bool:
+        """Applique une nouvelle valeur de l'API ; retourne True si le membre a joué depuis la précédente."""
+        decks = p.decks_used or 0
+        previous_decks = self.decks_used or 0
+        if decks < previous_decks or p.fame < self.fame:
+            # Nouvelle course : les compteurs sont repartis de zéro
+            previous_decks, previous_fame = 0, 0
+        else:
+            previous_fame = self.fame
+        self.decks_delta = decks - previous_decks
+        self.fame_delta = p.fame - previous_fame
+        self.name = p.name or self.name
+        self.fame = p.fame
+        self.decks_used = p.decks_used
+        self.decks_used_today = p.decks_used_today
+        self.last_seen = now
+        return self.decks_delta > 0 or self.fame_delta > 0
+
+
+class ParticipationTracker:
+    """Participation par clan et par membre, mise à jour à chaque course fluviale reçue.
+
+    Chaque récupération (préchargement ou commande) ne modifie que les membres dont les
+    compteurs ont bougé et enregistre l'écart. Un point de contrôle par clan et par
+    utilisateur Discord permet de répondre à « qui a joué depuis ma dernière consultation »
+    sans recalculer la course.
+    """
+
+    def __init__(self, retention: float = PARTICIPATION_RETENTION):
+        self.retention = retention
+        self._clans: Dict[str, Dict[str, MemberParticipation]] = {}           # clan -> tag -> membre
+        # (clan, utilisateur) -> (horodatage, tag -> (decks, points))
+        self._checkpoints: Dict[Tuple[str, int], Tuple[float, Dict[str, Tuple[int, int]]]] = {}
+        self.updates = 0
+
+    def get(self, clan_tag: str) -> Dict[str, MemberParticipation]:
+        return self._clans.get(clean_tag(clan_tag), {})
+
+    def update(self, clan_tag: str, participants: Iterable[Participant], now: Optional[float] = None) -> List[MemberParticipation]:
+        """Intègre les participants d'une course ; retourne les membres qui ont joué depuis la récupération précédente."""
+        now = now if now is not None else time.time()
+        records = self._clans.setdefault(clean_tag(clan_tag), {})
+        played = []
+        for p in participants:
+            if not p.tag:
+                continue
+            tag = clean_tag(p.tag)
+            record = records.get(tag)
+            if record is None:
+                record = records[tag] = MemberParticipation(tag, p.name)
+            if record.update(p, now):
+                played.append(record)
+        # Membres absents des réponses depuis longtemps (partis du clan)
+        for tag, record in list(records.items()):
+            if now - record.last_seen > self.retention:
+                del records[tag]
+        self.updates += 1
+        return played
+
+    def changes_since_check(
+        self, clan_tag: str, user_id: int, now: Optional[float] = None
+    ) -> Optional[List[Tuple[MemberParticipation, int, int]]]:
+        """(membre, decks joués, points gagnés) depuis le précédent appel de cet utilisateur pour ce clan.
+
+        Enregistre ensuite un nouveau point de contrôle pour lui seul. None au premier appel
+        (ou après PARTICIPATION_RETENTION sans consultation) : aucun point de comparaison.
+        """
+        now = now if now is not None else time.time()
+        clan_tag = clean_tag(clan_tag)
+        records = self.get(clan_tag)
+        previous = self._checkpoints.pop((clan_tag, user_id), None)
+        # Points de contrôle abandonnés (utilisateurs qui ne consultent plus)
+        for key, (taken_at, _) in list(self._checkpoints.items()):
+            if now - taken_at > self.retention:
+                del self._checkpoints[key]
+        self._checkpoints[(clan_tag, user_id)] = (now, {tag: (r.decks_used or 0, r.fame) for tag, r in records.items()})
+        if previous is None or now - previous[0] > self.retention:
+            return None
+        changes = []
+        for tag, record in records.items():
+            decks_before, fame_before = previous[1].get(tag, (0, 0))
+            if (record.decks_used or 0) < decks_before or record.fame < fame_before:
+                decks_before, fame_before = 0, 0 # Nouvelle course depuis le contrôle
+            decks, fame = (record.decks_used or 0) - decks_before, record.fame - fame_before
+            if decks > 0 or fame > 0:
+                changes.append((record, decks, fame))
+        changes.sort(key=lambda c: (c[1], c[2]), reverse=True)
+        return changes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clans": len(self._clans),
+            "members": sum(len(r) for r in self._clans.values()),
+            "checkpoints": len(self._checkpoints),
+            "updates": self.updates,
+        }
@@ -0,0 +1,105 @@
+# player_clans.py -- cache mémoire joueur -> clan actuel, tenu à jour par les réponses de l'API
+import logging
+import time
+from typing import Optional, Dict, Set, Tuple, Any
+from cr_api import CRClient, Player, Clan, PRIORITY_INTERACTIVE, is_stale
+from config import PLAYER_CLAN_TTL, PLAYER_CLAN_MAXSIZE
+from db import clean_tag
+
+logger = logging.getLogger("dh2.player_clans")
+
+
+class PlayerClanCache:
+    """Tag joueur -> tag du clan actuel (None = sans clan), avec TTL.
+
+    Abonné au client CR (CRClient.add_observer) : chaque Player reçu de l'API, quelle que
+    soit la commande ou la tâche qui l'a demandé, met à jour l'entrée ; chaque Clan reçu
+    confirme ses membres et retire ceux qui l'ont quitté (index inverse clan -> joueurs).
+    Un changement de clan est donc vu sans attendre l'expiration du TTL. Taille bornée
+    par maxsize, entrées expirées retirées au fil des écritures.
+    """
+
+    def __init__(self, ttl: float = PLAYER_CLAN_TTL, maxsize: int = PLAYER_CLAN_MAXSIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # tag -> (clan, expire_at), dans l'ordre d'expiration (TTL fixe, réinsertion à chaque set)
+        self._clans: Dict[str, Tuple[Optional[str], float]] = {}
+        self._members: Dict[str, Set[str]] = {} # clan -> joueurs en cache (index inverse)
+        self.hits = 0
+        self.misses = 0
+        self.changes = 0 # Changements de clan détectés
+
+    def get(self, player_tag: str) -> Tuple[bool, Optional[str]]:
+        """(trouvé, clan). trouvé=False si absent ou expiré."""
+        player_tag = clean_tag(player_tag)
+        entry = self._clans.get(player_tag)
+        if entry is None:
+            return False, None
+        if entry[1] <= time.monotonic():
+            self._remove(player_tag)
+            return False, None
+        return True, entry[0]
+
+    def set(self, player_tag: str, clan_tag: Optional[str]):
+        player_tag = clean_tag(player_tag)
+        clan_tag = clean_tag(clan_tag) if clan_tag else None
+        previous = self._remove(player_tag)
+        if previous is not None and previous[0] != clan_tag:
+            self.changes += 1
+            logger.debug(f"Changement de clan détecté pour #{player_tag} : {previous[0]} -> {clan_tag}")
+        self._clans[player_tag] = (clan_tag, time.monotonic() + self.ttl)
+        if clan_tag:
+            self._members.setdefault(clan_tag, set()).add(player_tag)
+        self._evict()
+
+    def _remove(self, player_tag: str) -> Optional[Tuple[Optional[str], float]]:
+        entry = self._clans.pop(player_tag, None)
+        if entry is not None and entry[0]:
+            members = self._members.get(entry[0])
+            if members is not None:
+                members.discard(player_tag)
+                if not members:
+                    del self._members[entry[0]]
+        return entry
+
+    def _evict(self):
+        """Retire les entrées expirées puis les plus anciennes au-delà de maxsize (en tête du dict)."""
+        now = time.monotonic()
+        while self._clans:
+            tag, (_, expire_at) = next(iter(self._clans.items()))
+            if expire_at > now and (self.maxsize <= 0 or len(self._clans) <= self.maxsize):
+                break
+            self._remove(tag)
+
+    def invalidate(self, player_tag: str):
+        self._remove(clean_tag(player_tag))
+
+    # --- Abonnement au client CR ---
+    def observe(self, model: Any):
+        if isinstance(model, Player) and model.tag:
+            self.set(model.tag, model.clan_tag)
+        elif isinstance(model, Clan) and model.tag:
+            clan_tag = clean_tag(model.tag)
+            members = {clean_tag(m.tag) for m in model.members if m.tag}
+            for tag in members:
+                self.set(tag, clan_tag)
+            # Anciens membres (index inverse) : leur nouveau clan est inconnu
+            for tag in self._members.get(clan_tag, set()) - members:
+                self.changes += 1
+                self._remove(tag)
+
+    async def resolve(self, cr: CRClient, player_tag: str, priority: int = PRIORITY_INTERACTIVE) -> Optional[str]:
+        """Clan actuel du joueur ; n'appelle /players qu'en cas d'absence (lève CRApiError)."""
+        found, clan_tag = self.get(player_tag)
+        if found:
+            self.hits += 1
+            return clan_tag
+        self.misses += 1
+        player = await cr.get_player(player_tag, priority=priority)
+        # Réponse fraîche : déjà enregistrée par observe() ; copie du cache API : enregistrée ici
+        if not is_stale(player):
+            self.set(player_tag, player.clan_tag)
+        return clean_tag(player.clan_tag) if player.clan_tag else None
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._clans), "hits": self.hits, "misses": self.misses, "changes": self.changes}
\ No newline at end of file
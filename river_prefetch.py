@@ -0,0 +1,232 @@
+# river_prefetch.py -- préchargement en tâche de fond des clans et courses fluviales des comptes liés
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Optional, Dict, Set, Tuple
+from background import PeriodicService
+from cr_api import (
+    CRClient, CRApiError, CRUnavailableError, Clan, Participant, RiverRaceClan,
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, is_stale,
+)
+from config import (
+    RIVER_RESET_UTC, RIVER_PREFETCH_INTERVAL, RIVER_PREFETCH_FAST_INTERVAL, RIVER_PREFETCH_FAST_WINDOW,
+    RIVER_PREFETCH_CONCURRENCY, RIVER_PREFETCH_MAX_AGE, RIVER_PREFETCH_CLANS_REFRESH, RIVER_CALL_TIMEOUT,
+)
+from db import get_all_user_tags, clean_tag, DAY
+from player_clans import PlayerClanCache
+from participation import ParticipationTracker
+
+logger = logging.getLogger("dh2.river")
+
+AFTER_RESET_WINDOW = 600 # Quelques minutes après le reset : le nouveau jour de guerre apparaît
+
+CURRENT_RACE = "Course Fluviale Actuelle"
+LAST_RACE = "Dernière Course Fluviale Terminée"
+
+
+def _reset_offset(value: str) -> int:
+    """'HH:MM' (UTC) -> secondes depuis minuit."""
+    hours, _, minutes = value.partition(":")
+    return (int(hours) * 3600 + int(minutes or 0) * 60) % DAY
+
+
+class WarSnapshot:
+    """Tout ce qu'il faut à /clan war-rankings pour un clan, déjà converti.
+
+    Résultat partiel possible : `clan` vaut None si /clans a échoué, et `errors`
+    indique quelle partie manque ("clan" ou "race" -> message d'erreur).
+    """
+    __slots__ = ("clan", "status", "standings", "participants", "stale", "errors", "fetched_at")
+
+    def __init__(
+        self,
+        clan: Optional[Clan],
+        status: str,
+        standings: Tuple[RiverRaceClan, ...],
+        participants: Tuple[Participant, ...],
+        stale: bool,
+        errors: Optional[Dict[str, str]] = None,
+    ):
+        self.clan = clan
+        self.status = status
+        self.standings = standings
+        self.participants = participants
+        self.stale = stale
+        self.errors = errors or {}
+        self.fetched_at = time.time()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class RiverRacePrefetcher(PeriodicService):
+    """Garde en mémoire clan + course fluviale des clans des comptes liés.
+
+    Rafraîchissement adaptatif : toutes les RIVER_PREFETCH_FAST_INTERVAL secondes à l'approche
+    du reset quotidien (et juste après), RIVER_PREFETCH_INTERVAL le reste du temps.
+    Les appels passent par la file basse priorité du limiteur, au plus `concurrency` clans à la fois.
+    """
+
+    logger = logger
+    failure_message = "Préchargement des courses fluviales échoué"
+
+    def __init__(
+        self,
+        cr: CRClient,
+        player_clans: PlayerClanCache,
+        participation: Optional[ParticipationTracker] = None,
+        reset_utc: str = RIVER_RESET_UTC,
+        interval: float = RIVER_PREFETCH_INTERVAL,
+        fast_interval: float = RIVER_PREFETCH_FAST_INTERVAL,
+        fast_window: float = RIVER_PREFETCH_FAST_WINDOW,
+        concurrency: int = RIVER_PREFETCH_CONCURRENCY,
+        max_age: float = RIVER_PREFETCH_MAX_AGE,
+        call_timeout: float = RIVER_CALL_TIMEOUT,
+    ):
+        super().__init__()
+        self.cr = cr
+        self.player_clans = player_clans
+        self.participation = participation # Alimenté par chaque course actuelle reçue
+        self.reset_offset = _reset_offset(reset_utc)
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.fast_window = fast_window
+        self.concurrency = max(1, concurrency)
+        self.max_age = max_age
+        self.call_timeout = call_timeout
+        self.snapshots: Dict[str, WarSnapshot] = {}
+        self.clans: Set[str] = set() # Clans des comptes liés (préchargés)
+        self.clans_updated_at: float = 0.0
+
+    # --- Lecture ---
+    def get(self, clan_tag: str) -> Optional[WarSnapshot]:
+        """Instantané en mémoire s'il est assez récent (sinon None : l'appelant passe par fetch)."""
+        snapshot = self.snapshots.get(clean_tag(clan_tag))
+        if snapshot is None or snapshot.age > self.max_age:
+            return None
+        return snapshot
+
+    async def _call(self, call: Awaitable[Any]) -> Any:
+        """Un appel API borné par call_timeout (attente du limiteur et nouvelles tentatives comprises)."""
+        try:
+            return await asyncio.wait_for(call, self.call_timeout)
+        except asyncio.TimeoutError:
+            raise CRUnavailableError(f"CR API timeout ({self.call_timeout:g}s)")
+
+    async def fetch(self, clan_tag: str, priority: int = PRIORITY_INTERACTIVE) -> WarSnapshot:
+        """Interroge l'API : clan et course actuelle en parallèle, puis le journal si aucune course en cours.
+
+        Si une seule des deux parties échoue, l'instantané est partiel (voir WarSnapshot.errors).
+        Lève CRApiError seulement si rien n'a pu être obtenu. Le résultat n'est gardé en mémoire
+        que pour les clans préchargés et s'il est complet.
+        """
+        clan_tag = clean_tag(clan_tag)
+        clan_result, race_result = await asyncio.gather(
+            self._call(self.cr.get_clan(clan_tag, priority=priority)),
+            self._call(self.cr.get_current_river_race(clan_tag, priority=priority)),
+            return_exceptions=True,
+        )
+        for result in (clan_result, race_result):
+            if isinstance(result, BaseException) and not isinstance(result, CRApiError):
+                raise result # Bug ou annulation : ne pas masquer
+
+        errors: Dict[str, str] = {}
+        clan: Optional[Clan] = None
+        if isinstance(clan_result, CRApiError):
+            errors["clan"] = str(clan_result)
+        else:
+            clan = clan_result
+
+        race = None
+        race_stale = False
+        status = CURRENT_RACE
+        if not isinstance(race_result, CRApiError):
+            race = race_result
+            race_stale = is_stale(race)
+        elif "Not found" in str(race_result):
+            # Pas de course en cours : dernière course terminée du journal
+            status = LAST_RACE
+            try:
+                war_log = await self._call(self.cr.get_clan_war_log(clan_tag, priority=priority))
+                race = war_log[0] if war_log else None
+                race_stale = is_stale(war_log) # Le marqueur est porté par le journal, pas par ses entrées
+            except CRApiError as e:
+                errors["race"] = str(e)
+        else:
+            errors["race"] = str(race_result)
+
+        if clan is None and race is None:
+            raise clan_result
+
+        standings: Tuple[RiverRaceClan, ...] = ()
+        participants: Tuple[Participant, ...] = ()
+        if race is not None:
+            standings = race.clans
+            participants = race.participants_for(clan_tag)
+            if self.participation is not None and status == CURRENT_RACE and not race_stale:
+                self.participation.update(clan_tag, participants)
+        stale = (clan is not None and is_stale(clan)) or race_stale
+        snapshot = WarSnapshot(clan, status, standings, participants, stale, errors)
+        if clan_tag in self.clans and not errors:
+            self.snapshots[clan_tag] = snapshot
+        return snapshot
+
+    # --- Planification ---
+    def seconds_until_reset(self, now: Optional[float] = None) -> float:
+        now = now if now is not None else time.time()
+        return (self.reset_offset - now) % DAY
+
+    def next_delay(self, now: Optional[float] = None) -> float:
+        until_reset = self.seconds_until_reset(now)
+        if until_reset <= self.fast_window or DAY - until_reset <= AFTER_RESET_WINDOW:
+            return self.fast_interval
+        # Réveil au plus tard au début de la période chaude
+        return max(self.fast_interval, min(self.interval, until_reset - self.fast_window))
+
+    # --- Rafraîchissement ---
+    async def _discover_clans(self):
+        """Recalcule l'ensemble des clans des comptes liés (cache joueur -> clan, sinon profils en basse priorité)."""
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def clan_of(tag: str) -> Optional[str]:
+            async with sem:
+                try:
+                    return await self.player_clans.resolve(self.cr, tag, priority=PRIORITY_BACKGROUND)
+                except CRApiError:
+                    return None
+
+        tags = set((await get_all_user_tags()).values())
+        found = await asyncio.gather(*(clan_of(t) for t in tags))
+        clans = {c for c in found if c}
+        if clans or not tags:
+            self.clans = clans
+            # Clans qui ne sont plus suivis : inutile de garder leurs données
+            for tag in list(self.snapshots):
+                if tag not in clans:
+                    del self.snapshots[tag]
+        self.clans_updated_at = time.time()
+
+    async def run_once(self) -> int:
+        """Rafraîchit tous les clans suivis ; retourne le nombre de succès."""
+        if time.time() - self.clans_updated_at >= RIVER_PREFETCH_CLANS_REFRESH:
+            await self._discover_clans()
+        started = time.perf_counter()
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def refresh(tag: str) -> bool:
+            async with sem:
+                try:
+                    snapshot = await self.fetch(tag, priority=PRIORITY_BACKGROUND)
+                    return not snapshot.errors
+                except CRApiError as e:
+                    logger.debug(f"Préchargement de la guerre de #{tag} impossible : {e}")
+                    return False
+
+        ok = sum(await asyncio.gather(*(refresh(t) for t in self.clans)))
+        if self.clans:
+            logger.info(
+                f"🌊 Courses fluviales préchargées : {ok}/{len(self.clans)} clans "
+                f"en {time.perf_counter() - started:.1f}s."
+            )
+        return ok
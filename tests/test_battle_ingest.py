@@ -0,0 +1,68 @@
+# tests/test_battle_ingest.py -- ingestion des journaux de combats (python -m unittest)
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DISCORD_TOKEN", "test")
+os.environ.setdefault("CLASH_ROYALE_TOKEN", "test")
+
+import db
+from battle_ingest import BattleLogIngestor
+from cr_api import Battle, StaleTuple
+
+
+def make_log(count: int, last_second: int):
+    return tuple(
+        Battle._new(
+            type="PvP", battle_time=f"20260101T{last_second - i:06d}.000Z", team_crowns=1,
+            opponent_crowns=0, opponent_name="adversaire", team_deck=("Knight",),
+        )
+        for i in range(count)
+    )
+
+
+class FakeCR:
+    """Client CR minimal : renvoie le journal préparé par le test."""
+
+    def __init__(self):
+        self.log = ()
+
+    async def get_battle_log(self, tag, priority=0):
+        return self.log
+
+
+class BattleLogIngestorTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db.db.path = os.path.join(self.tmp.name, "test.db")
+        await db.init_db()
+        await db.set_user_tag(1, "#ABC")
+        self.cr = FakeCR()
+        self.ingestor = BattleLogIngestor(self.cr, min_interval=10, max_interval=80)
+
+    async def asyncTearDown(self):
+        await db.close_db()
+        self.tmp.cleanup()
+
+    async def test_new_battles_are_inserted_once(self):
+        self.cr.log = make_log(5, 100)
+        self.assertEqual(await self.ingestor.run_once(now=0), 5)
+        self.assertEqual(await self.ingestor.run_once(now=10), 0)
+        self.assertEqual(len(await db.get_battles("ABC")), 5)
+
+    async def test_stale_log_is_skipped_without_backoff(self):
+        self.cr.log = make_log(5, 100)
+        await self.ingestor.run_once(now=0)
+        interval = self.ingestor.schedule["ABC"][1]
+
+        # Copie de secours (API en panne) contenant un combat inconnu : ni insertion ni allongement
+        self.cr.log = StaleTuple(make_log(6, 101))
+        self.assertEqual(await self.ingestor.run_once(now=interval), 0)
+        self.assertEqual(self.ingestor.schedule["ABC"], (2 * interval, interval))
+        self.assertEqual(len(await db.get_battles("ABC")), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()